@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Slider sweep benchmark for the service-side write coalescer
+
+Replays a brightness slider dragged from 0 to 255 against a simulated
+single-threaded service whose USB write takes a fixed round trip, and
+reports how many writes reach the mouse and how long after the last
+slider event the mouse settles on the final value.
+"""
+
+import argparse
+import heapq
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pulsard.coalesce import Coalescer
+
+
+class VirtualLoop:
+    """Event loop with a simulated clock, like GLib's but instantaneous"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.busy_until = 0.0
+        self._queue = []
+        self._seq = 0
+
+    def clock(self):
+        return self.now
+
+    def schedule(self, delay, callback):
+        self.at(self.now + delay, callback)
+
+    def at(self, when, callback):
+        self._seq += 1
+        heapq.heappush(self._queue, (when, self._seq, callback))
+
+    def block(self, seconds):
+        self.now += seconds
+
+    def run(self):
+        while self._queue:
+            when, _, callback = heapq.heappop(self._queue)
+            # the service handles one callback at a time
+            self.now = max(self.now, when)
+            callback()
+
+
+def sweep(event_interval, usb_round_trip, coalesce_interval):
+    loop = VirtualLoop()
+    written = []
+
+    def write(value):
+        loop.block(usb_round_trip)
+        written.append((loop.now, value))
+
+    if coalesce_interval:
+        coalescer = Coalescer(write, coalesce_interval, loop.schedule, loop.clock)
+        submit = coalescer.submit
+    else:
+        submit = write
+
+    values = range(0, 256)
+    for i, value in enumerate(values):
+        loop.at(i * event_interval, lambda value=value: submit(value))
+    loop.run()
+
+    last_event = (len(values) - 1) * event_interval
+    assert written[-1][1] == values[-1]
+    return len(written), written[-1][0] - last_event
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--event-interval-ms', type=float, default=2.0,
+                        help='time between slider valueChanged events')
+    parser.add_argument('--usb-ms', type=float, default=2.0,
+                        help='round trip of one MEM_SET frame')
+    args = parser.parse_args()
+
+    event_interval = args.event_interval_ms / 1000
+    usb_round_trip = args.usb_ms / 1000
+
+    print(f'256-step sweep, one event every {args.event_interval_ms} ms, '
+          f'{args.usb_ms} ms per USB write')
+    print(f'{"COALESCING":<12} {"WRITES":>7} {"SETTLE ms":>10}')
+    for interval in (0, 0.016, 0.05, 0.1):
+        writes, settle = sweep(event_interval, usb_round_trip, interval)
+        label = f'{interval * 1000:.0f} ms' if interval else 'off'
+        print(f'{label:<12} {writes:>7} {settle * 1000:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
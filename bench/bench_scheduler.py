@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+User action latency benchmark for the priority command scheduler
+
+A background thread keeps re-reading the whole settings image (the
+20-frame sweep a poller does) while the foreground issues DPI writes.
+Against a simulated mouse with a fixed round trip per frame, compares a
+lock held for whole operations with the scheduler, which hands the
+device over between frames.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pulsar_lib.device import BaseDevice
+from pulsar_lib.mouse import PulsarX2V2Mini
+from pulsar_lib.payloads import build_payload, checksum
+from pulsar_lib.scheduler import Priority, ScheduledDevice
+
+
+class SimulatedDevice(BaseDevice):
+    """Answers MEM_GET/MEM_SET from a flat image after a fixed round trip"""
+
+    def __init__(self, round_trip):
+        super().__init__()
+        self.round_trip = round_trip
+        self.image = bytearray(256)
+        for base in range(0, 0xc0, 4):
+            self.image[base + 3] = checksum(*self.image[base:base + 3])
+        self._replies = deque()
+
+    def write(self, payload):
+        payload = bytes(payload)
+        time.sleep(self.round_trip)
+        address, length = payload[4], payload[5]
+        if payload[1] == 0x07:
+            self.image[address:address + length] = payload[6:6 + length]
+            self._replies.append(payload)
+        else:
+            data = {f'index{6 + i:02d}': self.image[address + i] for i in range(length)}
+            self._replies.append(bytes(build_payload(
+                payload[1], index04=address, index05=length, **data)))
+
+    def _read(self):
+        return self._replies.popleft()
+
+
+class OperationLock(BaseDevice):
+    """Baseline: one lock around each whole library operation"""
+
+    def __init__(self, dev):
+        self.dev = dev
+        self.lock = dev.lock
+
+    def request(self, payload, command=None):
+        with self.lock:
+            return self.dev.request(payload, command)
+
+    @contextmanager
+    def operation(self):
+        with self.lock:
+            yield
+
+
+def run(round_trip, actions, scheduled):
+    sim = SimulatedDevice(round_trip)
+    if scheduled:
+        dev = ScheduledDevice(sim)
+        operation = lambda: dev.priority(Priority.BACKGROUND)
+    else:
+        dev = OperationLock(sim)
+        operation = dev.operation
+    poller = PulsarX2V2Mini(dev)
+    user = PulsarX2V2Mini(dev)
+    stop = threading.Event()
+
+    def poll():
+        while not stop.is_set():
+            with operation():
+                poller.read_settings()
+
+    thread = threading.Thread(target=poll)
+    thread.start()
+    latencies = []
+    rng = random.Random(0)
+    for _ in range(actions):
+        time.sleep(rng.uniform(0, 20 * round_trip))
+        started = time.perf_counter()
+        user.set_dpi(0, rng.randrange(400, 3200, 50))
+        latencies.append(time.perf_counter() - started)
+    stop.set()
+    thread.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--round-trip-ms', type=float, default=2.0)
+    parser.add_argument('--actions', type=int, default=50)
+    args = parser.parse_args()
+    round_trip = args.round_trip_ms / 1000
+
+    print(f'{"device sharing":<22} {"median ms":>10} {"p95 ms":>8} {"max ms":>8}')
+    for name, scheduled in (('lock per operation', False), ('frame scheduler', True)):
+        latencies = sorted(run(round_trip, args.actions, scheduled))
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f'{name:<22} {statistics.median(latencies) * 1000:>10.2f} '
+              f'{p95 * 1000:>8.2f} {latencies[-1] * 1000:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
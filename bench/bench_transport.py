@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Round-trip benchmark of the libusb and hidraw transports
+
+Times the opening of each backend and a run of single-register MEM_GET
+round trips on a real mouse. The libusb backend detaches the kernel
+driver from the configuration interface; the hidraw backend leaves it
+attached, so run this with the pointer in use to see both in practice.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pulsar_lib.constants import ADDR_POLLING_RATE, Command
+from pulsar_lib.device import Device
+from pulsar_lib.hidraw import HidrawDevice
+from pulsar_lib.payloads import build_payload
+
+
+def run(transport, count):
+    started = time.perf_counter()
+    dev = transport()
+    opened = time.perf_counter() - started
+    payload = build_payload(Command.MEM_GET, index04=ADDR_POLLING_RATE, index05=2)
+    latencies = []
+    try:
+        dev.clear_read_buffer()
+        for _ in range(count):
+            started = time.perf_counter()
+            dev.request(payload)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        dev.close()
+    return opened, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{"transport":<10} {"open ms":>8} {"median ms":>10} {"p95 ms":>8} {"max ms":>8}')
+    for name, transport in (('libusb', Device), ('hidraw', HidrawDevice)):
+        try:
+            opened, latencies = run(transport, args.count)
+        except Exception as e:
+            print(f'{name:<10} unavailable: {e}')
+            continue
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f'{name:<10} {opened * 1000:>8.2f} {statistics.median(latencies) * 1000:>10.3f} '
+              f'{p95 * 1000:>8.3f} {latencies[-1] * 1000:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
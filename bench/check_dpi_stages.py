@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Regression check for shrinking the DPI stage table
+
+Shrinks the table below the active stage through apply() and
+set_dpi_table() on a simulated mouse. The active stage must always end
+up inside the table, both on the mouse and through the getters, and a
+settings file naming a stage outside its own table must be rejected.
+Exits non-zero on the first violation.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pulsar_lib.constants import ADDR_DPI_MODE, ADDR_DPI_MODE_CT
+from pulsar_lib.mouse import PulsarX2V2Mini, invalid_registers
+
+from stress_snapshots import SimulatedDevice
+
+
+def check(name, dev, mouse, count, mode):
+    on_mouse = (dev.image[ADDR_DPI_MODE_CT], dev.image[ADDR_DPI_MODE])
+    seen = (len(mouse.get_dpi_table()), mouse.get_dpi_mode())
+    if on_mouse != (count, mode) or seen != (count, mode):
+        sys.exit(f'{name}: expected {count} stage(s) with stage {mode} active, '
+                 f'mouse has {on_mouse}, the getters report {seen}')
+    invalid = invalid_registers(dict(enumerate(dev.image)))
+    if invalid:
+        sys.exit(f'{name}: bad checksums in {", ".join(invalid)}')
+    print(f'{name}: ok')
+
+
+def fresh(stages, active):
+    dev = SimulatedDevice()
+    mouse = PulsarX2V2Mini(dev)
+    mouse.set_dpi_table([400 * (i + 1) for i in range(stages)])
+    mouse.dpi_mode = active
+    return dev, mouse
+
+
+def main():
+    dev, mouse = fresh(2, 1)
+    mouse.apply({'dpi_modes': [{'dpi': 400}]})
+    check('apply() shrinking below the active stage', dev, mouse, 1, 0)
+
+    dev, mouse = fresh(4, 1)
+    mouse.apply({'dpi_modes': [{'dpi': 400}, {'dpi': 800}, {'dpi': 1600}]})
+    check('apply() shrinking above the active stage', dev, mouse, 3, 1)
+
+    dev, mouse = fresh(4, 3)
+    mouse.apply({'active_dpi_mode': 0, 'dpi_modes': [{'dpi': 400}, {'dpi': 800}]})
+    check('apply() with an explicit active stage', dev, mouse, 2, 0)
+
+    dev, mouse = fresh(4, 3)
+    mouse.set_dpi_table([400, 800])
+    check('set_dpi_table() shrinking below the active stage', dev, mouse, 2, 1)
+
+    dev, mouse = fresh(2, 0)
+    try:
+        mouse.apply({'active_dpi_mode': 2, 'dpi_modes': [{'dpi': 400}, {'dpi': 800}]})
+    except ValueError:
+        print('active stage outside the file\'s own table: rejected')
+    else:
+        sys.exit('active stage outside the file\'s own table was accepted')
+
+
+if __name__ == '__main__':
+    main()
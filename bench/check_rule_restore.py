@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Regression check for leaving an application that has a rule
+
+Focuses a game with a rule, then applications without one, on a
+simulated mouse. Leaving the game must write back the DPI stage, the
+stage's DPI and the polling rate the user had before, and switching
+between two rules must still restore the values from before the first.
+Exits non-zero on the first violation.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pulsar_lib.mouse import PulsarX2V2Mini, invalid_registers
+from pulsar_lib.snapshot import Snapshot
+from pulsard.rules import RuleEngine, parse_rules
+
+from stress_snapshots import SimulatedDevice
+
+
+RULES = parse_rules({'rule': [
+    {'match': 'steam_app_*', 'dpi_mode': 1, 'dpi': 800, 'polling_rate': 500},
+    {'match': 'blender', 'dpi': 1600},
+]})
+
+
+def state(dev):
+    """What the mouse itself holds, not the cache"""
+    snapshot = Snapshot.decode(dict(enumerate(dev.image)))
+    return (snapshot.dpi_mode, [mode.dpi for mode in snapshot.dpi_modes], snapshot.polling_rate)
+
+
+def check(name, dev, expected):
+    seen = state(dev)
+    if seen != expected:
+        sys.exit(f'{name}: expected {expected}, mouse has {seen}')
+    invalid = invalid_registers(dict(enumerate(dev.image)))
+    if invalid:
+        sys.exit(f'{name}: bad checksums in {", ".join(invalid)}')
+    print(f'{name}: ok')
+
+
+def main():
+    dev = SimulatedDevice()
+    mouse = PulsarX2V2Mini(dev)
+    mouse.set_dpi_table([400, 3200])
+    mouse.polling_rate = 1000
+    before = state(dev)
+    engine = RuleEngine(mouse, RULES)
+    engine.replan()
+
+    if not engine.focus('steam_app_1'):
+        sys.exit('game rule was not applied')
+    check('game focused', dev, (1, [400, 800], 500))
+    if not engine.focus('konsole'):
+        sys.exit('leaving the game changed nothing')
+    check('game -> app without a rule', dev, before)
+    if engine.focus('dolphin'):
+        sys.exit('a second app without a rule wrote to the mouse')
+
+    engine.focus('steam_app_1')
+    engine.focus('blender')
+    check('game -> other rule', dev, (1, [400, 1600], 500))
+    engine.focus('konsole')
+    check('game -> other rule -> app without a rule', dev, before)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for shared device access and snapshot reads
+
+Writer threads flip the DPI table and the LED colors between two states,
+one MEM_SET frame each, while a refresher re-reads the whole image and
+reader threads decode snapshots as fast as they can. Every snapshot must
+show both stages from the same write, valid register checksums and a
+generation that never goes backwards; every reply must match its request.
+Exits non-zero on the first violation.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pulsar_lib.constants import (
+    ADDR_DPI_MODE,
+    ADDR_DPI_MODE_CT,
+    ADDR_LED_EFFECT,
+    ADDR_LED_ENABLED,
+    ADDR_POLLING_RATE,
+    REGISTERS,
+)
+from pulsar_lib.device import BaseDevice
+from pulsar_lib.mouse import PulsarX2V2Mini, invalid_registers
+from pulsar_lib.payloads import build_payload, checksum
+
+
+TABLES = ([400, 400], [3200, 3200])
+COLORS = (['#ff0000', '#ff0000'], ['#00ff00', '#00ff00'])
+
+
+class SimulatedDevice(BaseDevice):
+    """Answers MEM_GET/MEM_SET from a flat image, yielding the GIL mid-exchange"""
+
+    def __init__(self):
+        super().__init__()
+        self.image = bytearray(256)
+        self._replies = deque()
+        defaults = {
+            ADDR_POLLING_RATE: 0x01,
+            ADDR_DPI_MODE_CT: 2,
+            ADDR_DPI_MODE: 0,
+            ADDR_LED_EFFECT: 1,
+            ADDR_LED_ENABLED: 1,
+        }
+        for address, value in defaults.items():
+            self.image[address] = value
+        for start, checksum_address in REGISTERS.values():
+            self.image[checksum_address] = checksum(*self.image[start:checksum_address])
+        mouse = PulsarX2V2Mini(self)
+        mouse.read_settings()
+        mouse.set_dpi_table(TABLES[0])
+        mouse.set_led_colors(COLORS[0])
+
+    def write(self, payload):
+        payload = bytes(payload)
+        time.sleep(0)
+        address, length = payload[4], payload[5]
+        if payload[1] == 0x07:
+            self.image[address:address + length] = payload[6:6 + length]
+            self._replies.append(payload)
+        elif payload[1] == 0x0e:
+            self._replies.append(bytes(build_payload(0x0e, index05=1, index06=0)))
+        else:
+            data = {f'index{6 + i:02d}': self.image[address + i] for i in range(length)}
+            self._replies.append(bytes(build_payload(
+                payload[1], index04=address, index05=length, **data)))
+
+    def _read(self):
+        time.sleep(0)
+        return self._replies.popleft()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--readers', type=int, default=4)
+    args = parser.parse_args()
+
+    mouse = PulsarX2V2Mini(SimulatedDevice())
+    mouse.read_settings()
+    stop = threading.Event()
+    failures = []
+    counts = {'snapshots': 0, 'writes': 0, 'refreshes': 0}
+
+    def guarded(work):
+        def run():
+            try:
+                work()
+            except Exception as e:
+                failures.append(f'{threading.current_thread().name}: {e!r}')
+                stop.set()
+        return run
+
+    def write_dpi():
+        i = 0
+        while not stop.is_set():
+            mouse.set_dpi_table(TABLES[i % 2])
+            counts['writes'] += 1
+            i += 1
+
+    def write_colors():
+        i = 0
+        while not stop.is_set():
+            mouse.set_led_colors(COLORS[i % 2])
+            counts['writes'] += 1
+            i += 1
+
+    def refresh():
+        while not stop.is_set():
+            mouse.read_settings()
+            counts['refreshes'] += 1
+
+    def read():
+        last = -1
+        while not stop.is_set():
+            snapshot = mouse.snapshot()
+            modes = snapshot.dpi_modes
+            if modes[0].dpi != modes[1].dpi or modes[0].led_color != modes[1].led_color:
+                raise AssertionError(f'torn snapshot {modes}')
+            if snapshot.generation < last:
+                raise AssertionError(f'generation went back {last} -> {snapshot.generation}')
+            invalid = invalid_registers(mouse.settings)
+            if invalid:
+                raise AssertionError(f'torn image, bad checksums: {invalid}')
+            last = snapshot.generation
+            counts['snapshots'] += 1
+            # let the writers in between checks
+            time.sleep(0)
+
+    threads = [
+        threading.Thread(target=guarded(write_dpi), name='write-dpi'),
+        threading.Thread(target=guarded(write_colors), name='write-colors'),
+        threading.Thread(target=guarded(refresh), name='refresh'),
+    ] + [
+        threading.Thread(target=guarded(read), name=f'reader-{i}')
+        for i in range(args.readers)
+    ]
+    for thread in threads:
+        thread.start()
+    stop.wait(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"{counts['writes']} writes, {counts['refreshes']} full refreshes, "
+          f"{counts['snapshots']} snapshots checked")
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
+    print('no torn snapshots, no swapped replies')
+
+
+if __name__ == '__main__':
+    main()
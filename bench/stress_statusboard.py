@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Seqlock stress test and read benchmark for the pulsard status board
+
+A writer process flips the board between two complete states as fast as it
+can while this process reads it back. Every read must return one of the two
+states whole and a generation that never goes backwards. Exits non-zero on
+the first violation, then reports the cost of read_status().
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pulsard.statusboard import StatusBoard, read_status
+
+
+STATES = (
+    {
+        'connected': True,
+        'power': {'connected': False, 'battery_percent': 20, 'battery_millivolts': 3600},
+        'active_dpi_mode': 0,
+        'polling_rate_hz': 1000,
+        'dpi_modes': [{'dpi': 400}] * 4,
+    },
+    {
+        'connected': True,
+        'power': {'connected': True, 'battery_percent': 90, 'battery_millivolts': 4100},
+        'active_dpi_mode': 3,
+        'polling_rate_hz': 500,
+        'dpi_modes': [{'dpi': 3200}] * 4,
+    },
+)
+
+FIELDS = ('charging', 'battery_percent', 'battery_millivolts', 'active_dpi_mode',
+          'polling_rate_hz', 'dpis')
+
+
+def fields(status):
+    return tuple(str(status[field]) for field in FIELDS)
+
+
+def expected(path):
+    """What a reader sees for each state, written without contention"""
+    board = StatusBoard(path)
+    valid = set()
+    for state in STATES:
+        board.write(state)
+        valid.add(fields(read_status(path)))
+    board.close()
+    return valid
+
+
+def flip(path, stop):
+    board = StatusBoard(path)
+    n = 0
+    while not stop.is_set():
+        board.write(STATES[n & 1])
+        n += 1
+    board.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'pulsar-status')
+        valid = expected(path)
+        os.unlink(path)
+
+        stop = multiprocessing.Event()
+        writer = multiprocessing.Process(target=flip, args=(path, stop))
+        writer.start()
+        while read_status(path) is None:
+            time.sleep(0.001)
+
+        reads = 0
+        last = 0
+        deadline = time.monotonic() + args.seconds
+        try:
+            while time.monotonic() < deadline:
+                status = read_status(path)
+                reads += 1
+                if fields(status) not in valid:
+                    sys.exit(f'torn read: {status}')
+                if status['generation'] < last:
+                    sys.exit(f"generation went back from {last} to {status['generation']}")
+                last = status['generation']
+        finally:
+            stop.set()
+            writer.join()
+        print(f'{reads} reads during {last} writes, none torn')
+
+        start = time.perf_counter()
+        for _ in range(10000):
+            read_status(path)
+        print(f'read_status(): {(time.perf_counter() - start) / 10000 * 1e6:.1f} us per call, idle writer')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,10 +6,16 @@ echo "Installing Pulsar Mouse Python Tray Applet..."
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 INSTALL_DIR="$HOME/.local/share/plasma-pulsar"
 AUTOSTART_DIR="$HOME/.config/autostart"
+SYSTEMD_USER_DIR="$HOME/.config/systemd/user"
+DBUS_SERVICES_DIR="$HOME/.local/share/dbus-1/services"
 
 echo "Installing Python dependencies..."
 pip3 install --user PyQt6
 
+echo "Installing pulsar_lib and pulsard..."
+# provides ~/.local/bin/pulsard, which the user units below start
+pip3 install --user "$SCRIPT_DIR"
+
 echo "Creating installation directory..."
 mkdir -p "$INSTALL_DIR"
 
@@ -23,6 +29,12 @@ cp "$SCRIPT_DIR/plasma-pulsar-python/pulsar-mouse-tray.desktop" "$AUTOSTART_DIR/
 # Update the Exec path in the desktop file
 sed -i "s|/home/adrianbonpin/.local/share/plasma-pulsar|$INSTALL_DIR|g" "$AUTOSTART_DIR/pulsar-mouse-tray.desktop"
 
+echo "Installing the pulsard user service..."
+mkdir -p "$SYSTEMD_USER_DIR" "$DBUS_SERVICES_DIR"
+cp "$SCRIPT_DIR/systemd/pulsard.service" "$SCRIPT_DIR/systemd/pulsard-metrics.socket" "$SYSTEMD_USER_DIR/"
+cp "$SCRIPT_DIR/systemd/org.pulsar.Pulsar.service" "$DBUS_SERVICES_DIR/"
+systemctl --user daemon-reload || true
+
 echo ""
 echo "Installation complete!"
 echo ""
@@ -31,5 +43,6 @@ echo ""
 echo "To start it now, run:"
 echo "  python3 $INSTALL_DIR/pulsar_tray.py"
 echo ""
-echo "Or use the D-Bus service directly with:"
+echo "pulsard starts on demand (first D-Bus call or mouse hotplug) and exits"
+echo "when no client needs it. To start it by hand:"
 echo "  systemctl --user start pulsard"
@@ -15,13 +15,20 @@ from PyQt6.QtWidgets import (
     QLabel, QComboBox, QSlider, QPushButton, QLineEdit, QSpinBox, QGroupBox,
     QFrame, QGridLayout, QColorDialog
 )
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QIcon, QAction, QColor
 import dbus
+from dbus.mainloop.glib import DBusGMainLoop
 
 from pulsar_lib import Device, PulsarX2V2Mini, LEDEffect
 
 
+# Upper bound on how long a widget can stay pending
+DBUS_TIMEOUT_SECONDS = 5
+
+PENDING_STYLE = "font-style: italic;"
+
+
 class PulsarTrayApp:
     def __init__(self):
         self.app = QApplication(sys.argv)
@@ -64,28 +71,30 @@ class PulsarTrayApp:
         # Settings window
         self.settings_window = None
         
-        # D-Bus connection
-        self.dbus_connected = False
-        self.setup_dbus()
-        
         # Data
         self.battery_percent = 0
         self.is_charging = False
         self.is_connected = False
         self.settings = {}
         
-        # Timer for updates
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.refresh_data)
-        self.timer.start(5000)  # Update every 5 seconds
-        
-        # Initial refresh
-        self.refresh_data()
+        # D-Bus connection; Qt runs on the GLib event loop, so the service's
+        # signals are dispatched without any polling
+        DBusGMainLoop(set_as_default=True)
+        self.bus = dbus.SessionBus()
+        self.dbus_connected = False
+        self.service_started = False
+        self.bus.add_signal_receiver(
+            self.on_properties_changed,
+            signal_name='PropertiesChanged',
+            dbus_interface='org.pulsar.Pulsar',
+            path='/org/pulsar/Pulsar',
+        )
+        # Called right away with the current owner, which does the initial refresh
+        self.bus.watch_name_owner('org.pulsar.Pulsar', self.on_service_owner_changed)
     
     def setup_dbus(self):
         """Connect to D-Bus service"""
         try:
-            self.bus = dbus.SessionBus()
             self.proxy = self.bus.get_object('org.pulsar.Pulsar', '/org/pulsar/Pulsar')
             self.iface = dbus.Interface(self.proxy, 'org.pulsar.Pulsar')
             self.dbus_connected = True
@@ -97,45 +106,95 @@ class PulsarTrayApp:
         """Refresh data from mouse"""
         if not self.dbus_connected:
             self.setup_dbus()
-        
-        try:
-            # Check connection
-            connected = self.iface.IsConnected()
-            self.is_connected = connected
-            
-            if connected:
-                # Get power info
-                power = self.iface.GetPower()
-                self.battery_percent = int(power['battery_percent'])
-                self.is_charging = bool(power['connected'])
-                
-                # Update tooltip
-                self.tray_icon.setToolTip(
-                    f"Pulsar X2V2 Mini - {self.battery_percent}%"
-                    f"{' (charging)' if self.is_charging else ''}"
-                )
-                
-                # Update menu
-                self.battery_action.setText(
-                    f"🔋 {self.battery_percent}%"
-                    f"{' ⚡' if self.is_charging else ''}"
-                )
-                
-                # Get settings
-                self.settings = self.iface.GetAllSettings()
-                
-                # Update settings window if open
-                if self.settings_window and self.settings_window.isVisible():
-                    self.settings_window.update_from_data(self.settings)
-            else:
-                self.battery_action.setText("🔋 Mouse Disconnected")
-                self.tray_icon.setToolTip("Pulsar X2V2 Mini - Disconnected")
-                
-        except Exception as e:
-            print(f"Error refreshing data: {e}")
+        if not self.dbus_connected:
             self.battery_action.setText("🔋 Error")
+            return
+        
+        # Answered from the service's cache; the reply arrives on the event loop
+        self.iface.GetAllSettings(
+            reply_handler=self.on_settings_reply,
+            error_handler=self.on_refresh_error,
+            timeout=DBUS_TIMEOUT_SECONDS,
+        )
+    
+    def on_settings_reply(self, settings):
+        """Store a full settings fetch"""
+        self.is_connected = True
+        self.settings = dict(settings)
+        power = self.settings.get('power', {})
+        self.battery_percent = int(power.get('battery_percent', 0))
+        self.is_charging = bool(power.get('connected', False))
+        self.update_status()
+    
+    def on_refresh_error(self, e):
+        """Handle a failed settings fetch"""
+        if e.get_dbus_name() == 'org.pulsar.Pulsar.Error.NotConnected':
             self.is_connected = False
+            self.update_status()
+            return
+        print(f"Error refreshing data: {e}")
+        self.battery_action.setText("🔋 Error")
+        self.is_connected = False
+        self.dbus_connected = False
+    
+    def update_status(self):
+        """Show the cached state in the tray and the settings window"""
+        if self.is_connected:
+            # Update tooltip
+            self.tray_icon.setToolTip(
+                f"Pulsar X2V2 Mini - {self.battery_percent}%"
+                f"{' (charging)' if self.is_charging else ''}"
+            )
+            
+            # Update menu
+            self.battery_action.setText(
+                f"🔋 {self.battery_percent}%"
+                f"{' ⚡' if self.is_charging else ''}"
+            )
+            
+            # Update settings window if open
+            if self.settings_window and self.settings_window.isVisible():
+                self.settings_window.update_from_data(self.settings)
+        else:
+            self.battery_action.setText("🔋 Mouse Disconnected")
+            self.tray_icon.setToolTip("Pulsar X2V2 Mini - Disconnected")
+            if self.settings_window and self.settings_window.isVisible():
+                self.settings_window.update_status()
+    
+    def on_properties_changed(self, changed):
+        """Apply the keys the service reports as changed"""
+        if 'connected' in changed:
+            self.is_connected = bool(changed['connected'])
+            if self.is_connected and not self.settings:
+                self.refresh_data()
+                return
+        if 'power' in changed:
+            self.battery_percent = int(changed['power']['battery_percent'])
+            self.is_charging = bool(changed['power']['connected'])
+        self.settings.update(
+            (k, v) for k, v in changed.items() if k != 'connected')
+        self.update_status()
+    
+    def on_service_owner_changed(self, owner):
+        """Refresh everything when the service starts or restarts"""
+        if owner:
+            self.setup_dbus()
+            if self.dbus_connected:
+                # keeps an idle-exiting service alive for as long as the tray runs
+                self.iface.Subscribe(
+                    reply_handler=lambda: None,
+                    error_handler=lambda e: print(f"Error subscribing: {e}"),
+                    timeout=DBUS_TIMEOUT_SECONDS,
+                )
+            self.refresh_data()
+        else:
             self.dbus_connected = False
+            self.is_connected = False
+            self.update_status()
+            if not self.service_started:
+                # the first call starts the service through D-Bus activation
+                self.refresh_data()
+        self.service_started = True
     
     def on_tray_activated(self, reason):
         """Handle tray icon activation"""
@@ -154,7 +213,6 @@ class PulsarTrayApp:
     
     def quit(self):
         """Quit application"""
-        self.timer.stop()
         self.app.quit()
     
     def run(self):
@@ -163,10 +221,32 @@ class PulsarTrayApp:
         sys.exit(self.app.exec())
 
 
+def widget_value(widget):
+    if isinstance(widget, QComboBox):
+        return widget.currentIndex()
+    return widget.value()
+
+
+def set_widget_value(widget, value):
+    """Change a widget without triggering its change handler"""
+    widget.blockSignals(True)
+    if isinstance(widget, QComboBox):
+        widget.setCurrentIndex(value)
+    else:
+        widget.setValue(value)
+    widget.blockSignals(False)
+
+
 class SettingsWindow(QWidget):
     def __init__(self, app):
         super().__init__()
         self.app = app
+        # last value the service confirmed, and calls in flight, per widget
+        self.confirmed = {}
+        self.pending = {}
+        self.dpi_mode_count = 4
+        # slowest first, replaced by what the service reports for the mouse
+        self.polling_rates = [125, 250, 500, 1000]
         self.setWindowTitle("Pulsar Mouse Settings")
         self.setMinimumWidth(400)
         
@@ -216,7 +296,7 @@ class SettingsWindow(QWidget):
         
         polling_layout.addWidget(QLabel("Rate:"))
         self.polling_combo = QComboBox()
-        self.polling_combo.addItems(["125 Hz", "250 Hz", "500 Hz", "1000 Hz"])
+        self.polling_combo.addItems([f"{rate} Hz" for rate in self.polling_rates])
         self.polling_combo.currentIndexChanged.connect(self.on_polling_changed)
         polling_layout.addWidget(self.polling_combo)
         
@@ -264,134 +344,156 @@ class SettingsWindow(QWidget):
         
         layout.addStretch()
     
-    def update_from_data(self, settings):
-        """Update UI from settings data"""
-        # Update connection status
+    def update_status(self):
+        """Show the connection state"""
         if self.app.is_connected:
             self.status_label.setText(
                 f"Status: Connected - Battery: {self.app.battery_percent}%"
             )
         else:
             self.status_label.setText("Status: Disconnected")
+    
+    def update_from_data(self, settings):
+        """Update UI from settings data"""
+        self.update_status()
         
-        # Block signals while updating
-        self.profile_combo.blockSignals(True)
-        self.active_mode_combo.blockSignals(True)
-        self.polling_combo.blockSignals(True)
-        self.led_effect_combo.blockSignals(True)
-        self.led_brightness_slider.blockSignals(True)
-        for spinbox in self.dpi_spinboxes:
-            spinbox.blockSignals(True)
+        values = {}
         
-        # Update profile
-        active_profile = settings.get('active_profile', 0)
-        self.profile_combo.setCurrentIndex(active_profile)
+        # Profile
+        values[self.profile_combo] = settings.get('active_profile', 0)
         
-        # Update DPI modes
+        # DPI modes
         dpi_modes = settings.get('dpi_modes', [])
+        self.dpi_mode_count = len(dpi_modes)
+        # stages past the count are off on the mouse; the count is not
+        # changed from here
+        for i, spinbox in enumerate(self.dpi_spinboxes):
+            spinbox.setEnabled(i < self.dpi_mode_count)
         for i, mode_data in enumerate(dpi_modes[:4]):
             if isinstance(mode_data, dict):
-                self.dpi_spinboxes[i].setValue(mode_data.get('dpi', 1600))
+                values[self.dpi_spinboxes[i]] = mode_data.get('dpi', 1600)
             else:
-                self.dpi_spinboxes[i].setValue(1600)
+                values[self.dpi_spinboxes[i]] = 1600
         
-        # Update active mode
-        active_mode = settings.get('active_dpi_mode', 0)
-        self.active_mode_combo.setCurrentIndex(active_mode)
+        # Active mode
+        values[self.active_mode_combo] = settings.get('active_dpi_mode', 0)
         
-        # Update polling rate
+        # Polling rate
+        rates = sorted(settings.get('polling_rates', self.polling_rates))
+        if rates != self.polling_rates:
+            self.polling_rates = rates
+            self.polling_combo.blockSignals(True)
+            self.polling_combo.clear()
+            self.polling_combo.addItems([f"{rate} Hz" for rate in rates])
+            self.polling_combo.blockSignals(False)
         polling = settings.get('polling_rate_hz', 1000)
-        polling_idx = {125: 0, 250: 1, 500: 2, 1000: 3}.get(polling, 3)
-        self.polling_combo.setCurrentIndex(polling_idx)
+        values[self.polling_combo] = rates.index(polling) if polling in rates else rates.index(1000)
         
-        # Update LED
+        # LED
         led = settings.get('led', {})
         effect = led.get('effect', 'off')
-        effect_idx = {'off': 0, 'steady': 1, 'breathe': 2}.get(effect, 0)
-        self.led_effect_combo.setCurrentIndex(effect_idx)
-        
-        brightness = led.get('brightness', 128)
-        self.led_brightness_slider.setValue(brightness)
-        
-        # Re-enable signals
-        self.profile_combo.blockSignals(False)
-        self.active_mode_combo.blockSignals(False)
-        self.polling_combo.blockSignals(False)
-        self.led_effect_combo.blockSignals(False)
-        self.led_brightness_slider.blockSignals(False)
-        for spinbox in self.dpi_spinboxes:
-            spinbox.blockSignals(False)
+        values[self.led_effect_combo] = {'off': 0, 'steady': 1, 'breathe': 2}.get(effect, 0)
+        values[self.led_brightness_slider] = led.get('brightness', 128)
+        
+        # Widgets with a call in flight keep the user's value until it is answered
+        for widget, value in values.items():
+            if widget not in self.pending:
+                self.confirmed[widget] = value
+                set_widget_value(widget, value)
+    
+    def call(self, method, *args, widget=None, on_reply=None):
+        """Call the service without blocking the GUI thread"""
+        # The widget already shows the new value (optimistic update); it is
+        # marked pending until the service answers and rolled back to the last
+        # confirmed value if the call fails.
+        if not (self.app.is_connected and self.app.dbus_connected):
+            if widget is not None:
+                self.rollback(widget)
+            return
+        if widget is not None:
+            self.pending[widget] = self.pending.get(widget, 0) + 1
+            widget.setStyleSheet(PENDING_STYLE)
+            value = widget_value(widget)
+        self.status_label.setText("Status: Applying...")
+        
+        def reply(*result):
+            if widget is not None:
+                self.confirmed[widget] = value
+                self.finish(widget)
+            self.update_status()
+            if on_reply is not None:
+                on_reply(*result)
+        
+        def error(e):
+            print(f"Error calling {method}: {e}")
+            if widget is not None:
+                self.finish(widget)
+                if not self.pending.get(widget):
+                    self.rollback(widget)
+            self.status_label.setText(f"Status: {method} failed")
+        
+        getattr(self.app.iface, method)(
+            *args,
+            reply_handler=reply,
+            error_handler=error,
+            timeout=DBUS_TIMEOUT_SECONDS,
+        )
+    
+    def finish(self, widget):
+        """Clear the pending mark once no call for the widget is in flight"""
+        self.pending[widget] -= 1
+        if not self.pending[widget]:
+            del self.pending[widget]
+            widget.setStyleSheet("")
+    
+    def rollback(self, widget):
+        """Show the last value the service confirmed"""
+        if widget in self.confirmed:
+            set_widget_value(widget, self.confirmed[widget])
     
     def on_profile_changed(self, index):
         """Handle profile change"""
-        if self.app.is_connected and self.app.dbus_connected:
-            try:
-                self.app.iface.SetProfile(int(index))
-            except Exception as e:
-                print(f"Error setting profile: {e}")
+        self.call('SetProfile', int(index), widget=self.profile_combo)
     
     def on_dpi_changed(self, mode, value):
         """Handle DPI change"""
-        if self.app.is_connected and self.app.dbus_connected:
-            try:
-                self.app.iface.SetDPI(int(mode), int(value))
-            except Exception as e:
-                print(f"Error setting DPI: {e}")
+        if mode >= self.dpi_mode_count:
+            # a disabled stage, leave the stage count alone
+            self.call('SetDPI', int(mode), int(value), widget=self.dpi_spinboxes[mode])
+            return
+        # Send the whole table so the service writes it in at most two frames
+        dpis = [int(spinbox.value()) for spinbox in self.dpi_spinboxes[:self.dpi_mode_count]]
+        self.call('SetDPITable', dbus.Array(dpis, signature='i'),
+                  widget=self.dpi_spinboxes[mode])
     
     def on_active_mode_changed(self, index):
         """Handle active mode change"""
-        if self.app.is_connected and self.app.dbus_connected:
-            try:
-                dpi = self.dpi_spinboxes[index].value()
-                self.app.iface.SetDPI(int(index), int(dpi))
-            except Exception as e:
-                print(f"Error setting active mode: {e}")
+        self.call('SetDPIMode', int(index), widget=self.active_mode_combo)
     
     def on_polling_changed(self, index):
         """Handle polling rate change"""
-        if self.app.is_connected and self.app.dbus_connected:
-            try:
-                rates = [125, 250, 500, 1000]
-                self.app.iface.SetPollingRate(rates[index])
-            except Exception as e:
-                print(f"Error setting polling rate: {e}")
+        self.call('SetPollingRate', self.polling_rates[index], widget=self.polling_combo)
     
     def on_led_effect_changed(self, index):
         """Handle LED effect change"""
-        if self.app.is_connected and self.app.dbus_connected:
-            try:
-                effects = ["off", "steady", "breathe"]
-                self.app.iface.SetLEDEffect(effects[index])
-            except Exception as e:
-                print(f"Error setting LED effect: {e}")
+        effects = ["off", "steady", "breathe"]
+        self.call('SetLEDEffect', effects[index], widget=self.led_effect_combo)
     
     def on_led_brightness_changed(self, value):
         """Handle LED brightness change"""
-        if self.app.is_connected and self.app.dbus_connected:
-            try:
-                self.app.iface.SetLEDBrightness(int(value))
-            except Exception as e:
-                print(f"Error setting LED brightness: {e}")
+        self.call('SetLEDBrightness', int(value), widget=self.led_brightness_slider)
     
     def on_led_color_clicked(self):
         """Handle LED color picker"""
         color = QColorDialog.getColor()
-        if color.isValid() and self.app.is_connected and self.app.dbus_connected:
-            try:
-                color_str = f"#{color.red():02x}{color.green():02x}{color.blue():02x}"
-                active_mode = self.active_mode_combo.currentIndex()
-                self.app.iface.SetLEDColor(int(active_mode), color_str)
-            except Exception as e:
-                print(f"Error setting LED color: {e}")
+        if color.isValid():
+            color_str = f"#{color.red():02x}{color.green():02x}{color.blue():02x}"
+            active_mode = self.active_mode_combo.currentIndex()
+            self.call('SetLEDColor', int(active_mode), color_str)
     
     def on_restore_defaults(self):
         """Restore factory defaults"""
-        if self.app.is_connected and self.app.dbus_connected:
-            try:
-                self.app.iface.RestoreDefaults()
-                self.app.refresh_data()
-            except Exception as e:
-                print(f"Error restoring defaults: {e}")
+        self.call('RestoreDefaults', on_reply=self.app.refresh_data)
 
 
 def main():
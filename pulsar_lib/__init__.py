@@ -7,7 +7,12 @@ from .constants import (
     DeviceEvent,
 )
 from .device import Device
+from .capture import RecordingDevice, ReplayDevice
+from .hidraw import HidrawDevice
+from .events import Event
+from .scheduler import Priority, ScheduledDevice
 from .mouse import PulsarX2V2Mini
+from .snapshot import Snapshot
 from .payloads import (
     PowerDetails,
     parse_power_details,
@@ -16,7 +21,14 @@ from .payloads import (
 
 __all__ = [
     'Device',
+    'HidrawDevice',
+    'RecordingDevice',
+    'ReplayDevice',
+    'ScheduledDevice',
+    'Priority',
     'PulsarX2V2Mini',
+    'Snapshot',
+    'Event',
     'PowerDetails',
     'parse_power_details',
     'from_payload',
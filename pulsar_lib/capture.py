@@ -0,0 +1,126 @@
+import struct
+import time
+from collections import deque
+
+from .device import BaseDevice
+
+
+CAPTURE_MAGIC = b'PLSRCAP1'
+
+WRITE = b'w'
+READ = b'r'
+DISCARD = b'd'
+
+# direction, time.monotonic() timestamp, frame
+RECORD = struct.Struct('<cd17s')
+
+
+def iter_capture(path):
+    with open(path, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f'{path} is not a frame capture')
+        while True:
+            record = f.read(RECORD.size)
+            if len(record) < RECORD.size:
+                return
+            yield RECORD.unpack(record)
+
+
+class RecordingDevice(BaseDevice):
+    """Pass frames through to a device while appending them to a capture file"""
+
+    def __init__(self, dev: BaseDevice, path: str):
+        self.dev = dev
+        # share the wrapped device's lock so its reads and ours exclude each other
+        self.lock = dev.lock
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_MAGIC)
+
+    def _record(self, direction, frame):
+        self._file.write(RECORD.pack(direction, time.monotonic(), bytes(frame)))
+        self._file.flush()
+
+    def write(self, payload):
+        self.dev.write(payload)
+        self._record(WRITE, payload)
+
+    def _read(self):
+        resp = self.dev._read()
+        self._record(READ, resp)
+        return resp
+
+    def read_frame(self, timeout):
+        resp = self.dev.read_frame(timeout)
+        if resp is not None:
+            self._record(READ, resp)
+        return resp
+
+    def clear_read_buffer(self):
+        stale = self.dev.clear_read_buffer()
+        for frame in stale:
+            self._record(DISCARD, frame)
+        return stale
+
+    @property
+    def product_id(self):
+        return self.dev.product_id
+
+    @property
+    def link(self) -> str:
+        return self.dev.link
+
+    def is_connected(self):
+        return self.dev.is_connected()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        self.dev.close()
+
+
+class ReplayDevice(BaseDevice):
+    """Serve a recorded session back to the library without hardware"""
+
+    def __init__(self, path: str, realtime: bool = False, strict: bool = True):
+        super().__init__()
+        self._records = deque(iter_capture(path))
+        self.realtime = realtime
+        self.strict = strict
+        self._offset = None
+
+    def _next(self, direction):
+        if not self._records:
+            raise TimeoutError('capture exhausted')
+        if self._records[0][0] != direction:
+            raise TimeoutError(
+                f'capture has {self._records[0][0]!r} next, library asked for {direction!r}')
+        _, timestamp, frame = self._records.popleft()
+        if self.realtime:
+            if self._offset is None:
+                self._offset = time.monotonic() - timestamp
+            delay = timestamp + self._offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return frame
+
+    def write(self, payload):
+        frame = self._next(WRITE)
+        if self.strict and frame != bytes(payload).ljust(len(frame), b'\0'):
+            raise RuntimeError(
+                f'library sent {bytes(payload).hex()}, capture has {frame.hex()}')
+
+    def _read(self):
+        return self._next(READ)
+
+    def read_frame(self, timeout):
+        if self._records and self._records[0][0] != READ:
+            # the live device would have timed out waiting here
+            return None
+        return self._next(READ)
+
+    def clear_read_buffer(self):
+        stale = []
+        while self._records and self._records[0][0] == DISCARD:
+            stale.append(self._next(DISCARD))
+        return stale
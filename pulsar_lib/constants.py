@@ -3,8 +3,11 @@ import enum
 
 VENDOR_ID = 0x3554
 WIRELESS_1KHZ_DEVICE_ID = 0xf508
+WIRELESS_4KHZ_DEVICE_ID = 0xf509
 WIRED_DEVICE_ID = 0xf507
 
+PRODUCT_IDS = (WIRED_DEVICE_ID, WIRELESS_1KHZ_DEVICE_ID, WIRELESS_4KHZ_DEVICE_ID)
+
 INTERFACES = {
     0: {'endpoint': 0x81, 'length': 8},
     1: {'endpoint': 0x82, 'length': 17},
@@ -26,12 +29,23 @@ class Command(enum.IntEnum):
 
 
 PollingRateHz = {
+    4000: 0x20,
+    2000: 0x40,
     1000: 0x01,
     500: 0x02,
     250: 0x04,
     125: 0x08,
 }
 
+# rates each product can be set to; unknown products (e.g. a replayed
+# capture) are limited to the ones every model supports
+DEFAULT_POLLING_RATES = (1000, 500, 250, 125)
+PRODUCT_POLLING_RATES = {
+    WIRED_DEVICE_ID: DEFAULT_POLLING_RATES,
+    WIRELESS_1KHZ_DEVICE_ID: DEFAULT_POLLING_RATES,
+    WIRELESS_4KHZ_DEVICE_ID: (4000, 2000) + DEFAULT_POLLING_RATES,
+}
+
 
 class LEDEffect(enum.IntEnum):
     BREATHE = 0x02
@@ -64,6 +78,8 @@ class DPIChangeKey(enum.IntEnum):
 class DeviceEvent(enum.IntEnum):
     POWER = 0x40
     DPI_MODE = 0x01
+
+    # 08:0a:00:00:00:0a:04:00:00:00:00:00:00:00:00:00:35
     UNKNOWN_1 = 0x04
 
 
@@ -81,11 +97,11 @@ LOD_MM_MAX = 0x02
 DPI_MODE_MIN = 0x00
 DPI_MODE_MAX = 0x03
 
-DPI_LOCK_MIN = 0x00
-DPI_LOCK_MAX = 0x15
+DPI_LOCK_MIN = 0x00  # 50
+DPI_LOCK_MAX = 0x15  # 1100
 
-AUTOSLEEP_TIME_MIN = 0x01
-AUTOSLEEP_TIME_MAX = 0x3c
+AUTOSLEEP_TIME_MIN = 0x01  # 10 seconds
+AUTOSLEEP_TIME_MAX = 0x3c  # 10 minutes
 
 LED_BRIGHTNESS_MIN = 0x00
 LED_BRIGHTNESS_MAX = 0xff
@@ -179,6 +195,59 @@ ADDR_AUTOSLEEP_TIME = 0xb7
 ADDR_AUTOSLEEP_TIME_CHECKSUM = 0xb8
 
 
+# every register is followed by a checksum byte: 0x55 - sum(values)
+REGISTERS = {
+    'polling_rate': (ADDR_POLLING_RATE, ADDR_POLLING_RATE_CHECKSUM),
+    'dpi_mode_count': (ADDR_DPI_MODE_CT, ADDR_DPI_MODE_CT_CHECKSUM),
+    'dpi_mode': (ADDR_DPI_MODE, ADDR_DPI_MODE_CHECKSUM),
+    'lod_mm': (ADDR_LOD_MM, ADDR_LOD_MM_CHECKSUM),
+    'mode0_dpi': (ADDR_MODE0_DPI_INDEX1, ADDR_MODE0_DPI_CHECKSUM),
+    'mode1_dpi': (ADDR_MODE1_DPI_INDEX1, ADDR_MODE1_DPI_CHECKSUM),
+    'mode2_dpi': (ADDR_MODE2_DPI_INDEX1, ADDR_MODE2_DPI_CHECKSUM),
+    'mode3_dpi': (ADDR_MODE3_DPI_INDEX1, ADDR_MODE3_DPI_CHECKSUM),
+    'mode0_led_color': (ADDR_MODE0_LED_COLOR_R, ADDR_MODE0_LED_COLOR_CHECKSUM),
+    'mode1_led_color': (ADDR_MODE1_LED_COLOR_R, ADDR_MODE1_LED_COLOR_CHECKSUM),
+    'mode2_led_color': (ADDR_MODE2_LED_COLOR_R, ADDR_MODE2_LED_COLOR_CHECKSUM),
+    'mode3_led_color': (ADDR_MODE3_LED_COLOR_R, ADDR_MODE3_LED_COLOR_CHECKSUM),
+    'led_effect': (ADDR_LED_EFFECT, ADDR_LED_EFFECT_CHECKSUM),
+    'led_brightness': (ADDR_LED_BRIGHTNESS, ADDR_LED_BRIGHTNESS_CHECKSUM),
+    'led_breathe_speed': (ADDR_LED_BREATHE_SPEED, ADDR_LED_BREATHE_SPEED_CHECKSUM),
+    'led_enabled': (ADDR_LED_ENABLED, ADDR_LED_ENABLED_CHECKSUM),
+    'button_left': (ADDR_BUTTON_LEFT_MODE, ADDR_BUTTON_LEFT_CHECKSUM),
+    'button_right': (ADDR_BUTTON_RIGHT_MODE, ADDR_BUTTON_RIGHT_CHECKSUM),
+    'button_wheel': (ADDR_BUTTON_WHEEL_MODE, ADDR_BUTTON_WHEEL_CHECKSUM),
+    'button_back': (ADDR_BUTTON_BACK_MODE, ADDR_BUTTON_BACK_CHECKSUM),
+    'button_forward': (ADDR_BUTTON_FORWARD_MODE, ADDR_BUTTON_FORWARD_CHECKSUM),
+    'debounce_time': (ADDR_DEBOUNCE_TIME, ADDR_DEBOUNCE_TIME_CHECKSUM),
+    'motion_sync': (ADDR_MOTION_SYNC, ADDR_MOTION_SYNC_CHECKSUM),
+    'angle_snapping': (ADDR_ANGLE_SNAPPING, ADDR_ANGLE_SNAPPING_CHECKSUM),
+    'lod_ripple': (ADDR_LOD_RIPPLE, ADDR_LOD_RIPPLE_CHECKSUM),
+    'autosleep_time': (ADDR_AUTOSLEEP_TIME, ADDR_AUTOSLEEP_TIME_CHECKSUM),
+}
+
+
+class Volatility(enum.Enum):
+    # only changes when a host writes it
+    STATIC = 'static'
+    # the mouse changes it by itself, e.g. the DPI button
+    DEVICE = 'device'
+
+
+# registers not listed are STATIC
+REGISTER_VOLATILITY = {
+    'dpi_mode': Volatility.DEVICE,
+}
+
+# seconds a cached value is trusted without max_age, None is forever
+VOLATILITY_TTL = {
+    Volatility.STATIC: None,
+    Volatility.DEVICE: 1.0,
+}
+
+# battery level and charger state drift continuously
+POWER_TTL = 30.0
+
+
 ADDR_BUTTON_CUSTOM1 = (0x01, 0x20)
 
 
@@ -188,6 +257,7 @@ class CustomKey(enum.IntEnum):
     REFRESH = 0x27
 
 
+# seems to follow the pattern of (length, v1, v2, v3) until a 0x00 length
 BUTTONS_CUSTOM = {
     (0x02, 0x82, CustomKey.SEARCH,  0x02, 0x42, CustomKey.SEARCH,  0x02, 0x49): 'Search',
     (0x02, 0x82, CustomKey.STOP,    0x02, 0x42, CustomKey.STOP,    0x02, 0x3f): 'Stop',
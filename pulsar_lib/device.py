@@ -1,19 +1,104 @@
-import usb
-import usb.core
-import usb.util
+import threading
+import time
+
+try:
+    import usb
+    import usb.core
+    import usb.util
+except ImportError:
+    # only the hidraw, capture and replay backends are usable
+    usb = None
 
 from .constants import (
     VENDOR_ID,
     WIRELESS_1KHZ_DEVICE_ID,
+    WIRELESS_4KHZ_DEVICE_ID,
     WIRED_DEVICE_ID,
     INTERFACES,
 )
+from .stats import TransportStats
+
+
+class BaseDevice:
+    """Frame transport shared by the USB, capture and replay backends"""
+
+    # longest a blocking wait for unsolicited frames keeps other threads out
+    READ_FRAME_SLICE_MS = 10
+
+    # USB product id of the mouse, None for wrappers and replays
+    product_id = None
+
+    # 'wired' or 'wireless', '-' when not known
+    link = '-'
+
+    def __init__(self):
+        # held for each request/reply exchange so threads never swap replies
+        self.lock = threading.RLock()
+
+    def write(self, payload):
+        raise NotImplementedError
+
+    def _read(self):
+        raise NotImplementedError
+
+    def read_frame(self, timeout: int):
+        """Wait up to timeout milliseconds for a frame, None if nothing arrived"""
+        raise NotImplementedError
+
+    def clear_read_buffer(self):
+        return []
 
+    def is_connected(self):
+        return True
+
+    def request(self, payload, command=None):
+        """Send a frame and read up to its reply, returning (reply, skipped frames)"""
+        payload = bytes(payload)
+        if command is None:
+            command = payload[1]
+        with self.lock:
+            self.write(payload)
+            skipped = []
+            while True:
+                resp = self._read()
+                if resp[1] == command:
+                    return resp, skipped
+                skipped.append(resp)
+
+    def hold(self):
+        """Keep the device to the caller across several requests"""
+        return self.lock
 
-class Device:
-    VENDOR_ID = 0x3554
-    WIRELESS_1KHZ_DEVICE_ID = 0xf508
-    WIRED_DEVICE_ID = 0xf507
+    def read(self, expect=None):
+        while True:
+            resp = self._read()
+            if expect is None:
+                return resp
+            from .payloads import from_payload
+            inst = from_payload(resp)
+            if isinstance(inst, expect):
+                return inst
+
+    def close(self):
+        pass
+
+
+def device_product_id(dev):
+    """USB product id of a device, looking through scheduler and capture wrappers"""
+    while dev is not None:
+        product_id = getattr(dev, 'product_id', None)
+        if product_id is not None:
+            return product_id
+        dev = getattr(dev, 'dev', None)
+    return None
+
+
+class Device(BaseDevice):
+    VENDOR_ID = 0x3554  # Pulsar
+    WIRELESS_1KHZ_DEVICE_ID = 0xf508  # X2V2 Mini (1khz wireless dongle)
+    WIRELESS_4KHZ_DEVICE_ID = 0xf509  # X2V2 Mini (4khz wireless dongle)
+    WIRED_DEVICE_ID = 0xf507  # X2V2 Mini (wired)
+    PRODUCT_IDS = (WIRED_DEVICE_ID, WIRELESS_1KHZ_DEVICE_ID, WIRELESS_4KHZ_DEVICE_ID)
 
     INTERFACES = {
         0: {'endpoint': 0x81, 'length': 8},
@@ -21,19 +106,52 @@ class Device:
         2: {'endpoint': 0x83, 'length': 7},
     }
 
-    def __init__(self):
+    def __init__(self, device=None):
         self.interface = 1
         info = self.INTERFACES[self.interface]
         self.length = info['length']
         self.endpoint = info['endpoint']
-        self.device = None
+        super().__init__()
+        self.device = device
+        self.stats = TransportStats()
         self._connect()
 
+    @classmethod
+    def find_all(cls):
+        """Open every attached Pulsar mouse"""
+        if usb is None:
+            raise RuntimeError("pyusb is not installed, use the hidraw backend")
+        found = usb.core.find(
+            find_all=True,
+            idVendor=cls.VENDOR_ID,
+            custom_match=lambda d: d.idProduct in cls.PRODUCT_IDS,
+        )
+        return [cls(device) for device in found]
+
+    @property
+    def location(self) -> str:
+        if self.device is None:
+            return '-'
+        return f'{self.device.bus:03d}:{self.device.address:03d}'
+
+    @property
+    def link(self) -> str:
+        if self.device is None:
+            return '-'
+        return 'wired' if self.device.idProduct == self.WIRED_DEVICE_ID else 'wireless'
+
+    @property
+    def product_id(self):
+        return None if self.device is None else self.device.idProduct
+
     def _connect(self):
-        for device_id in (self.WIRED_DEVICE_ID, self.WIRELESS_1KHZ_DEVICE_ID):
-            self.device = usb.core.find(idVendor=self.VENDOR_ID, idProduct=device_id)
-            if self.device is not None:
-                break
+        if usb is None:
+            raise RuntimeError("pyusb is not installed, use the hidraw backend")
+        if self.device is None:
+            for device_id in self.PRODUCT_IDS:
+                self.device = usb.core.find(idVendor=self.VENDOR_ID, idProduct=device_id)
+                if self.device is not None:
+                    break
         
         if self.device is None:
             raise RuntimeError("No Pulsar mouse found")
@@ -59,7 +177,7 @@ class Device:
 
     def is_connected(self):
         try:
-            for device_id in (self.WIRED_DEVICE_ID, self.WIRELESS_1KHZ_DEVICE_ID):
+            for device_id in self.PRODUCT_IDS:
                 dev = usb.core.find(idVendor=self.VENDOR_ID, idProduct=device_id)
                 if dev is not None:
                     return True
@@ -78,28 +196,49 @@ class Device:
             payload,
             timeout=1000)
         assert res == len(payload)
+        self.stats.sent(payload)
 
     def _read(self):
-        data = self.device.read(self.endpoint, self.length, timeout=1000)
-        return data.tobytes()
-
-    def clear_read_buffer(self):
-        """Clear any stale data from the read buffer"""
         try:
-            while True:
-                self.device.read(self.endpoint, self.length, timeout=1)
+            data = self.device.read(self.endpoint, self.length, timeout=1000)
         except usb.core.USBTimeoutError:
-            pass
+            self.stats.timed_out()
+            raise
+        data = data.tobytes()
+        self.stats.received(data)
+        return data
 
-    def read(self, expect=None):
+    def read_frame(self, timeout: int):
+        # wait in slices so a request from another thread is never stuck
+        # behind the whole timeout
+        deadline = time.monotonic() + timeout / 1000
         while True:
-            resp = self._read()
-            if expect is None:
-                return resp
-            from .payloads import from_payload
-            inst = from_payload(resp)
-            if isinstance(inst, expect):
-                return inst
+            remaining = int((deadline - time.monotonic()) * 1000)
+            with self.lock:
+                try:
+                    data = self.device.read(self.endpoint, self.length,
+                                            timeout=max(1, min(remaining, self.READ_FRAME_SLICE_MS)))
+                except usb.core.USBTimeoutError:
+                    data = None
+            if data is not None:
+                data = data.tobytes()
+                self.stats.received(data)
+                return data
+            if remaining <= self.READ_FRAME_SLICE_MS:
+                return None
+
+    def clear_read_buffer(self):
+        """Clear any stale data from the read buffer"""
+        stale = []
+        with self.lock:
+            try:
+                while True:
+                    frame = self.device.read(self.endpoint, self.length, timeout=1).tobytes()
+                    self.stats.received(frame)
+                    stale.append(frame)
+            except usb.core.USBTimeoutError:
+                pass
+        return stale
 
     def close(self):
         """Release USB interface and cleanup"""
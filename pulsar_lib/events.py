@@ -0,0 +1,50 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, NamedTuple, Optional
+
+from .payloads import DeviceEventPayload
+
+
+# unsolicited frames held while a command waits for its reply; the oldest
+# are dropped once a consumer falls this far behind
+EVENT_QUEUE_SIZE = 64
+
+
+class Event(NamedTuple):
+    """A decoded DEVICE_EVENT frame, or None for another program's write, and what it changed"""
+    time: float
+    payload: Optional[DeviceEventPayload]
+    changes: Dict[str, object]
+
+
+class EventQueue:
+    """Bounded buffer of (time.monotonic(), frame) pairs that drops the oldest"""
+
+    def __init__(self, maxsize: int = EVENT_QUEUE_SIZE):
+        self._frames = deque(maxlen=maxsize)
+        self.dropped = 0
+
+    def put(self, frame, stamp: Optional[float] = None):
+        if len(self._frames) == self._frames.maxlen:
+            self.dropped += 1
+        self._frames.append((time.monotonic() if stamp is None else stamp, bytes(frame)))
+
+    def get(self):
+        return self._frames.popleft() if self._frames else None
+
+    def __len__(self):
+        return len(self._frames)
+
+
+async def iterate_async(events):
+    """Drive a blocking event generator from asyncio, one frame in flight at a time"""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            event = await loop.run_in_executor(None, next, events, None)
+            if event is None:
+                return
+            yield event
+    finally:
+        events.close()
@@ -0,0 +1,162 @@
+import glob
+import os
+import select
+import time
+from typing import List, Optional, Tuple
+
+from .device import BaseDevice, Device
+from .stats import TransportStats
+
+
+SYSFS_HIDRAW = '/sys/class/hidraw'
+
+
+def _hid_id(hidraw_sysfs: str) -> Optional[Tuple[int, int]]:
+    """(vendor, product) from the uevent of a hidraw node's HID device"""
+    try:
+        with open(os.path.join(hidraw_sysfs, 'device', 'uevent')) as f:
+            for line in f:
+                if line.startswith('HID_ID='):
+                    _, vendor, product = line.strip().split('=', 1)[1].split(':')
+                    return int(vendor, 16), int(product, 16)
+    except OSError:
+        pass
+    return None
+
+
+def _interface_dir(hidraw_sysfs: str) -> str:
+    # .../1-2:1.1/0003:3554:F508.0001/hidraw/hidraw3 -> .../1-2:1.1
+    return os.path.dirname(os.path.realpath(os.path.join(hidraw_sysfs, 'device')))
+
+
+def _interface_number(hidraw_sysfs: str) -> Optional[int]:
+    interface = _interface_dir(hidraw_sysfs)
+    try:
+        with open(os.path.join(interface, 'bInterfaceNumber')) as f:
+            return int(f.read(), 16)
+    except (OSError, ValueError):
+        return None
+
+
+def find_hidraw_nodes(vendor_id: int, product_ids, interface: int) -> List[str]:
+    """/dev/hidrawN nodes of the given USB interface, found through sysfs"""
+    nodes = []
+    for hidraw_sysfs in sorted(glob.glob(os.path.join(SYSFS_HIDRAW, 'hidraw*'))):
+        hid_id = _hid_id(hidraw_sysfs)
+        if hid_id is None or hid_id[0] != vendor_id or hid_id[1] not in product_ids:
+            continue
+        if _interface_number(hidraw_sysfs) != interface:
+            continue
+        nodes.append(os.path.join('/dev', os.path.basename(hidraw_sysfs)))
+    return nodes
+
+
+def sibling_hidraw_node(path: str, interface: int) -> Optional[str]:
+    """hidraw node of another interface of the same USB device as path"""
+    usb_device = os.path.dirname(_interface_dir(os.path.join(SYSFS_HIDRAW, os.path.basename(path))))
+    for hidraw_sysfs in sorted(glob.glob(os.path.join(SYSFS_HIDRAW, 'hidraw*'))):
+        if (os.path.dirname(_interface_dir(hidraw_sysfs)) == usb_device
+                and _interface_number(hidraw_sysfs) == interface):
+            return os.path.join('/dev', os.path.basename(hidraw_sysfs))
+    return None
+
+
+class HidrawDevice(BaseDevice):
+    """Talk to the mouse through /dev/hidrawN, leaving the kernel driver attached"""
+
+    # same interface and report layout as the libusb backend
+    INTERFACE = 1
+    LENGTH = Device.INTERFACES[1]['length']
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        self.fd = None
+        if path is None:
+            nodes = find_hidraw_nodes(Device.VENDOR_ID, Device.PRODUCT_IDS, self.INTERFACE)
+            if not nodes:
+                raise RuntimeError("No Pulsar mouse found")
+            path = nodes[0]
+        self.path = path
+        self.stats = TransportStats()
+        self.fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+
+    @classmethod
+    def find_all(cls):
+        """Open every attached Pulsar mouse"""
+        return [
+            cls(path)
+            for path in find_hidraw_nodes(Device.VENDOR_ID, Device.PRODUCT_IDS, cls.INTERFACE)
+        ]
+
+    @property
+    def location(self) -> str:
+        return self.path
+
+    @property
+    def product_id(self) -> Optional[int]:
+        hid_id = _hid_id(os.path.join(SYSFS_HIDRAW, os.path.basename(self.path)))
+        return None if hid_id is None else hid_id[1]
+
+    @property
+    def link(self) -> str:
+        product_id = self.product_id
+        if product_id is None:
+            return '-'
+        return 'wired' if product_id == Device.WIRED_DEVICE_ID else 'wireless'
+
+    def is_connected(self):
+        return self.fd is not None and os.path.exists(self.path)
+
+    def write(self, payload):
+        # the first byte (0x08) doubles as the report ID, so this is the same
+        # output report the libusb backend sends with SET_REPORT 0x0208
+        payload = bytes(payload)
+        res = os.write(self.fd, payload)
+        assert res == len(payload)
+        self.stats.sent(payload)
+
+    def _wait(self, timeout: float) -> Optional[bytes]:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return None
+        resp = os.read(self.fd, self.LENGTH)
+        self.stats.received(resp)
+        return resp
+
+    def _read(self):
+        resp = self._wait(1.0)
+        if resp is None:
+            self.stats.timed_out()
+            raise TimeoutError(f'no reply from {self.path}')
+        return resp
+
+    def read_frame(self, timeout: int):
+        # sliced under the lock the same way as Device.read_frame
+        deadline = time.monotonic() + timeout / 1000
+        while True:
+            remaining = int((deadline - time.monotonic()) * 1000)
+            with self.lock:
+                resp = self._wait(max(1, min(remaining, self.READ_FRAME_SLICE_MS)) / 1000)
+            if resp is not None or remaining <= self.READ_FRAME_SLICE_MS:
+                return resp
+
+    def clear_read_buffer(self):
+        """Clear any stale data from the read buffer"""
+        stale = []
+        with self.lock:
+            while True:
+                try:
+                    frame = os.read(self.fd, self.LENGTH)
+                except BlockingIOError:
+                    break
+                self.stats.received(frame)
+                stale.append(frame)
+        return stale
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __del__(self):
+        self.close()
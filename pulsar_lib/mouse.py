@@ -1,5 +1,8 @@
+import math
+import threading
+import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, NamedTuple, Optional
 
 from .constants import (
     ADDR_ANGLE_SNAPPING,
@@ -31,6 +34,8 @@ from .constants import (
     ADDR_DPI_MODE_CHECKSUM,
     ADDR_DPI_MODE_CT,
     ADDR_DPI_MODE_CT_CHECKSUM,
+    DPI_MODE_CT_MAX,
+    DPI_MODE_CT_MIN,
     ADDR_LED_BREATHE_SPEED,
     ADDR_LED_BREATHE_SPEED_CHECKSUM,
     ADDR_LED_BRIGHTNESS,
@@ -79,6 +84,8 @@ from .constants import (
     ADDR_MOTION_SYNC_CHECKSUM,
     ADDR_POLLING_RATE,
     ADDR_POLLING_RATE_CHECKSUM,
+    Command,
+    DEFAULT_POLLING_RATES,
     DPI_MAX,
     DPI_MIN,
     LED_BRIGHTNESS_MAX,
@@ -87,14 +94,28 @@ from .constants import (
     LOD_MM_MIN,
     PollingRateHz,
     LEDEffect,
+    POWER_TTL,
+    PRODUCT_POLLING_RATES,
+    REGISTER_VOLATILITY,
+    REGISTERS,
+    VOLATILITY_TTL,
+    Volatility,
 )
 from .payloads import (
+    MEM_FRAME_LENGTH,
+    DeviceEventPayload,
+    DPIModeDeviceEventPayload,
+    PowerDeviceEventPayload,
     RequestActiveProfilePayload,
     SetActiveProfilePayload,
+    build_mem_set_payload,
     build_payload,
+    from_payload,
+    plan_mem_set,
     parse_power_details,
 )
-from .device import Device
+from .device import Device, device_product_id
+from .events import Event, EventQueue, iterate_async
 
 
 def inverse(dict_obj):
@@ -102,6 +123,14 @@ def inverse(dict_obj):
 
 
 def dpi_int_to_raw(dpi):
+    """
+    dpi_index1: same as dpi_index2
+    dpi_index2: (val+1)*50; sequential 00 to ff
+    dpi_index3: (factor*12800)
+        00: factor=0;    50 <= dpi <= 12750
+        44: factor=1; 12850 <= dpi <= 25600
+        88: factor=2; 25650 <= dpi <= 26000
+    """
     if not (DPI_MIN <= dpi <= DPI_MAX):
         raise ValueError
     quo, rem = divmod(dpi, 50)
@@ -163,6 +192,25 @@ def int_to_bool(value):
         raise ValueError
 
 
+# address -> name of the register (value or checksum byte) it belongs to
+REGISTER_AT = {
+    address: name
+    for name, (start, checksum_address) in REGISTERS.items()
+    for address in range(start, checksum_address + 1)
+}
+
+
+def invalid_registers(image: Dict[int, int]) -> List[str]:
+    """Names of the cached registers whose checksum byte does not match"""
+    raw = bytes(image.get(a, 0) for a in range(0x100))
+    return [
+        name
+        for name, (start, checksum_address) in REGISTERS.items()
+        if start in image and checksum_address in image
+        and (0x55 - sum(raw[start:checksum_address])) & 0xff != raw[checksum_address]
+    ]
+
+
 @dataclass
 class ModeAddresses:
     dpi_index1: int
@@ -215,6 +263,13 @@ ADDR_MODE = [
 ]
 
 
+class CachedImage(NamedTuple):
+    """Memory image of the active profile, replaced as a whole and never mutated"""
+    generation: int
+    profile: Optional[int]
+    values: Dict[int, int]
+
+
 class PulsarX2V2Mini:
     LED_EFFECTS = {
         'off',
@@ -222,20 +277,145 @@ class PulsarX2V2Mini:
         'steady',
     }
 
-    def __init__(self, dev: Device):
+    def __init__(self, dev: Device, verify_writes: bool = False):
         self.dev = dev
-        self.settings: Dict[int, int] = {}
-        self._profile: Optional[int] = None
+        self.verify_writes = verify_writes
+        # readers take self._image once and never lock; writers build a new
+        # CachedImage under self._lock and publish it with one assignment
+        self._image = CachedImage(0, None, {})
+        self._lock = threading.RLock()
+        self._snapshot = None
+        self._events = EventQueue()
+        # memory images of the profiles that are not active, by profile
+        self._images: Dict[int, Dict[int, int]] = {}
+        # register name -> time.monotonic() of the last read or write
+        self._read_at: Dict[str, float] = {}
+        self._power = None
+        self._power_at = 0.0
 
-    def get_power(self):
-        self.dev.clear_read_buffer()
-        payload = build_payload(0x04)
-        self.dev.write(payload)
-        while True:
-            resp = self.dev.read()
-            if resp[1] == 0x04:
-                break
-        return parse_power_details(resp)
+    @property
+    def settings(self) -> Dict[int, int]:
+        return self._image.values
+
+    @property
+    def _profile(self) -> Optional[int]:
+        return self._image.profile
+
+    @property
+    def _generation(self) -> int:
+        return self._image.generation
+
+    def _publish(self, values: Dict[int, int], profile: Optional[int] = None):
+        with self._lock:
+            image = self._image
+            if profile is None:
+                profile = image.profile
+            self._image = CachedImage(image.generation + 1, profile, values)
+
+    def _touch(self, addresses):
+        now = time.monotonic()
+        for address in addresses:
+            name = REGISTER_AT.get(address)
+            if name is not None:
+                self._read_at[name] = now
+
+    def _store(self, values: Dict[int, int]):
+        self._touch(values)
+        with self._lock:
+            current = self._image.values
+            if any(current.get(a) != v for a, v in values.items()):
+                self._publish({**current, **values})
+
+    def _forget(self):
+        self._read_at = {}
+        self._publish({})
+
+    def _keep_event(self, frame):
+        """Hold on to a device event or foreign write that arrived while waiting for a reply"""
+        if frame[1] in (Command.DEVICE_EVENT, Command.MEM_SET):
+            self._events.put(frame)
+
+    def absorb_write(self, frame) -> bool:
+        """Fold the MEM_SET echo of another program's write into the cache, True if it was one"""
+        if frame[1] != Command.MEM_SET:
+            return False
+        self._store(dict(enumerate(frame[6:6+frame[5]], frame[4])))
+        return True
+
+    def _clear_read_buffer(self):
+        for frame in self.dev.clear_read_buffer():
+            self._keep_event(frame)
+
+    def _request(self, payload, command: Optional[int] = None) -> bytes:
+        resp, skipped = self.dev.request(payload, command)
+        for frame in skipped:
+            self._keep_event(frame)
+        return resp
+
+    def get_power(self, max_age: float = 0):
+        """Battery and charger state, from the cache if read within max_age seconds"""
+        if self._power is not None and time.monotonic() - self._power_at <= max_age:
+            return self._power
+        self._clear_read_buffer()
+        resp = self._request(build_payload(0x04))
+        self._power = parse_power_details(resp)
+        self._power_at = time.monotonic()
+        return self._power
+
+    def _mem_get(self, start_address: int, length: int = MEM_FRAME_LENGTH) -> Dict[int, int]:
+        if not (1 <= length <= MEM_FRAME_LENGTH):
+            raise ValueError('must not be longer than 10')
+        payload = build_payload(
+            0x08,
+            index04=start_address,
+            index05=length,
+        )
+        resp = self._request(payload)
+        assert resp[4] == start_address
+        assert resp[5] == length
+        return dict(enumerate(resp[6:6+length], start_address))
+
+    def read_image(self, start: int = 0x00, end: int = 0xff, depth: int = 1) -> bytes:
+        """Read a contiguous memory range using full-width frames"""
+        # with depth > 1 several requests are kept in flight and responses are
+        # matched by address, hiding the interrupt endpoint's polling interval
+        windows = [
+            (address, min(MEM_FRAME_LENGTH, end + 1 - address))
+            for address in range(start, end + 1, MEM_FRAME_LENGTH)
+        ]
+        image = {}
+        while windows:
+            # a shared device may serve other callers between bursts
+            with self.dev.hold():
+                in_flight = []
+                while windows and len(in_flight) < depth:
+                    address, length = windows.pop(0)
+                    self.dev.write(build_payload(0x08, index04=address, index05=length))
+                    in_flight.append((address, length))
+                while in_flight:
+                    resp = self.dev.read()
+                    window = (resp[4], resp[5])
+                    if resp[1] != 0x08 or window not in in_flight:
+                        self._keep_event(resp)
+                        continue
+                    in_flight.remove(window)
+                    image.update(enumerate(resp[6:6+window[1]], window[0]))
+        self._store(image)
+        return bytes(image[a] for a in range(start, end + 1))
+
+    def write_image(self, image: bytes, start: int = 0x00, dry_run: bool = False) -> List[bytearray]:
+        """Write back an image, sending only the frames whose bytes differ"""
+        end = start + len(image) - 1
+        missing = [a for a in range(start, end + 1) if a not in self.settings]
+        if missing:
+            self.read_image(min(missing), max(missing))
+        target = dict(enumerate(image, start))
+        payloads = []
+        for addresses in plan_mem_set(target, self.settings):
+            payloads.append(build_mem_set_payload(addresses))
+            if not dry_run:
+                self._mem_set(addresses)
+        return payloads
 
     def read_settings(self):
         min_addr = 0x00
@@ -243,29 +423,34 @@ class PulsarX2V2Mini:
         current = min_addr
         settings = {}
         while current <= (max_addr + 10):
-            length = 10
-            payload = build_payload(
-                0x08,
-                index04=current,
-                index05=length,
-            )
-            self.dev.write(payload)
-            resp = self.dev.read()
-            assert resp[4] == current
-            assert resp[5] == length
-            for (k, v) in enumerate(resp[6:6+length], current):
-                settings[k] = v
+            settings.update(self._mem_get(current))
             current += 10
-        self.settings = settings
+        self._touch(settings)
+        with self._lock:
+            if settings != self.settings:
+                self._publish(settings)
+
+    def read_addresses(self, addresses) -> Dict[int, int]:
+        """Read only the windows covering the given addresses into the cache"""
+        values = {}
+        pending = sorted(set(addresses))
+        while pending:
+            start = pending[0]
+            end = max(a for a in pending if a < start + MEM_FRAME_LENGTH)
+            values.update(self._mem_get(start, end - start + 1))
+            pending = [a for a in pending if a > end]
+        self._store(values)
+        return {a: values[a] for a in addresses}
 
     def read_profile(self):
-        self.dev.write(RequestActiveProfilePayload())
-        resp = self.dev.read()
+        resp = self._request(RequestActiveProfilePayload())
         # Parse the response bytes to get profile number
         # Response format: [header, command, ..., profile, ..., checksum]
         # Profile is at index 6
         if len(resp) > 6:
-            self._profile = resp[6]
+            with self._lock:
+                if resp[6] != self._profile:
+                    self._publish(self.settings, resp[6])
         else:
             raise ValueError(f"Invalid profile response: {resp}")
 
@@ -277,37 +462,59 @@ class PulsarX2V2Mini:
 
     @profile.setter
     def profile(self, value: int):
-        from .payloads import checksum
         inst = SetActiveProfilePayload(value)
-        self.dev.write(inst)
-        resp = self.dev.read()
+        resp = SetActiveProfilePayload.from_payload(self._request(inst))
         assert resp.profile == inst.profile
-        self._profile = inst.profile
+        if inst.profile != self._profile:
+            self._switch_image(inst.profile)
+
+    def _switch_image(self, profile: int):
+        """Swap in the cached image of profile, or an empty one to be read lazily"""
+        with self._lock:
+            if self._profile is not None and self.settings:
+                self._images[self._profile] = self.settings
+            self._read_at = {}
+            self._publish(self._images.pop(profile, {}), profile)
+            if self.settings and not self._probe_image():
+                # changed behind our back, e.g. by the vendor software
+                self._forget()
+            elif self.settings:
+                # the probe vouches for the cached image as of now
+                self._touch(self.settings)
+
+    def _probe_image(self) -> bool:
+        """Check one frame of the cached image against the mouse"""
+        window = self._mem_get(0x00)
+        return all(self.settings.get(a) == v for a, v in window.items())
 
     def restore(self):
         payload = build_payload(0x09)
-        self.dev.write(payload)
-        resp = self.dev.read()
+        resp = self._request(payload)
         assert resp == payload
-        self.settings.clear()
+        # not known whether this resets only the active profile
+        self._images.clear()
+        self._forget()
 
     @property
     def is_on(self) -> bool:
         payload = build_payload(0x03)
-        self.dev.write(payload)
-        while True:
-            resp = self.dev.read()
-            if resp[1] == 0x03:
-                break
+        resp = self._request(payload)
         return int_to_bool(resp[6])
 
+    @property
+    def polling_rates(self) -> List[int]:
+        """Polling rates this model accepts, fastest first"""
+        return list(PRODUCT_POLLING_RATES.get(device_product_id(self.dev), DEFAULT_POLLING_RATES))
+
     @property
     def polling_rate(self) -> int:
-        return inverse(PollingRateHz)[self.settings[ADDR_POLLING_RATE]]
+        return inverse(PollingRateHz)[self._current(['polling_rate'])[ADDR_POLLING_RATE]]
 
     @polling_rate.setter
     def polling_rate(self, rate: int):
         from .payloads import checksum
+        if rate not in self.polling_rates:
+            raise ValueError(f'polling rate must be one of {sorted(self.polling_rates)}')
         val = PollingRateHz[rate]
         self._mem_set({
             ADDR_POLLING_RATE: int(val),
@@ -315,39 +522,35 @@ class PulsarX2V2Mini:
         })
 
     def _mem_set(self, addresses: Dict[int, int]):
-        from .payloads import checksum
-        length = len(addresses)
-        if not (1 <= length <= 10):
-            raise ValueError('must not be longer than 10')
-        start_address = min(addresses)
-        indexes = [
-            'index06',
-            'index07',
-            'index08',
-            'index09',
-            'index10',
-            'index11',
-            'index12',
-            'index13',
-            'index14',
-            'index15',
-        ]
-        kwargs = {
-            'index04': start_address,
-            'index05': length,
-        }
-        for index, address in zip(indexes, range(start_address, start_address+length)):
-            kwargs[index] = addresses[address]
-
-        payload = build_payload(0x07, **kwargs)
+        payload = build_mem_set_payload(addresses)
         # Note: is_on check removed - mouse can still accept commands even if is_on reports False
-        self.dev.write(payload)
-        resp = self.dev.read()
-        self.settings.update(addresses)
+        self._request(payload)
+        if self.verify_writes:
+            actual = self._mem_get(min(addresses), len(addresses))
+            self._store(actual)
+            if actual != addresses:
+                bad = ', '.join(f'0x{a:02x}' for a in sorted(actual) if actual[a] != addresses[a])
+                raise RuntimeError(f'write verification failed at {bad}')
+        self._store(addresses)
+
+    def audit(self, reread: bool = True) -> List[str]:
+        """Validate every cached register checksum, re-reading only the failures"""
+        invalid = invalid_registers(self.settings)
+        if invalid and reread:
+            self.read_addresses([
+                address
+                for name in invalid
+                for address in range(REGISTERS[name][0], REGISTERS[name][1] + 1)
+            ])
+            invalid = invalid_registers(self.settings)
+        return invalid
+
+    def get_dpi_mode(self, max_age: Optional[float] = None) -> int:
+        return self._current(['dpi_mode'], max_age)[ADDR_DPI_MODE]
 
     @property
     def dpi_mode(self) -> int:
-        return self.settings[ADDR_DPI_MODE]
+        return self.get_dpi_mode()
 
     @dpi_mode.setter
     def dpi_mode(self, value: int):
@@ -363,7 +566,7 @@ class PulsarX2V2Mini:
 
     @property
     def lod_mm(self) -> int:
-        return self.settings[ADDR_LOD_MM]
+        return self._current(['lod_mm'])[ADDR_LOD_MM]
 
     @lod_mm.setter
     def lod_mm(self, value: int):
@@ -379,11 +582,11 @@ class PulsarX2V2Mini:
 
     @property
     def debounce_time(self) -> int:
-        return self.settings[ADDR_DEBOUNCE_TIME]
+        return self._current(['debounce_time'])[ADDR_DEBOUNCE_TIME]
 
     @property
     def motion_sync(self) -> bool:
-        return bool(self.settings[ADDR_MOTION_SYNC])
+        return bool(self._current(['motion_sync'])[ADDR_MOTION_SYNC])
 
     @motion_sync.setter
     def motion_sync(self, enabled: bool):
@@ -396,7 +599,7 @@ class PulsarX2V2Mini:
 
     @property
     def lod_ripple(self) -> bool:
-        return bool(self.settings[ADDR_LOD_RIPPLE])
+        return bool(self._current(['lod_ripple'])[ADDR_LOD_RIPPLE])
 
     @lod_ripple.setter
     def lod_ripple(self, enabled: bool):
@@ -409,7 +612,7 @@ class PulsarX2V2Mini:
 
     @property
     def angle_snapping(self) -> bool:
-        return bool(self.settings[ADDR_ANGLE_SNAPPING])
+        return bool(self._current(['angle_snapping'])[ADDR_ANGLE_SNAPPING])
 
     @angle_snapping.setter
     def angle_snapping(self, enabled: bool):
@@ -422,7 +625,7 @@ class PulsarX2V2Mini:
 
     @property
     def led_effect(self) -> LEDEffect:
-        return LEDEffect(self.settings[ADDR_LED_EFFECT])
+        return LEDEffect(self._current(['led_effect'])[ADDR_LED_EFFECT])
 
     @led_effect.setter
     def led_effect(self, value):
@@ -435,7 +638,7 @@ class PulsarX2V2Mini:
 
     @property
     def led_brightness(self) -> int:
-        return self.settings[ADDR_LED_BRIGHTNESS]
+        return self._current(['led_brightness'])[ADDR_LED_BRIGHTNESS]
 
     @led_brightness.setter
     def led_brightness(self, value: int):
@@ -451,15 +654,15 @@ class PulsarX2V2Mini:
 
     @property
     def led_breathe_speed(self) -> int:
-        return self.settings[ADDR_LED_BREATHE_SPEED]
+        return self._current(['led_breathe_speed'])[ADDR_LED_BREATHE_SPEED]
 
     @property
     def autosleep_time(self) -> int:
-        return self.settings[ADDR_AUTOSLEEP_TIME] * 10
+        return self._current(['autosleep_time'])[ADDR_AUTOSLEEP_TIME] * 10
 
     @property
     def led_enabled(self) -> bool:
-        return bool(self.settings[ADDR_LED_ENABLED])
+        return bool(self._current(['led_enabled'])[ADDR_LED_ENABLED])
 
     @led_enabled.setter
     def led_enabled(self, enabled: bool):
@@ -470,13 +673,14 @@ class PulsarX2V2Mini:
             ADDR_LED_ENABLED_CHECKSUM: checksum(value)
         })
 
-    def get_dpi(self, mode: int) -> int:
+    def get_dpi(self, mode: int, max_age: Optional[float] = None) -> int:
         addrs = ADDR_MODE[mode]
+        settings = self._current([f'mode{mode}_dpi'], max_age)
         return dpi_raw_to_int(
             bytearray([
-                self.settings[addrs.dpi_index1],
-                self.settings[addrs.dpi_index2],
-                self.settings[addrs.dpi_index3],
+                settings[addrs.dpi_index1],
+                settings[addrs.dpi_index2],
+                settings[addrs.dpi_index3],
             ])
         )
 
@@ -497,18 +701,20 @@ class PulsarX2V2Mini:
 
     @dpi.setter
     def dpi(self, value: int):
-        return self.set_dpi(self.dpi_mode, value)
+        # the DPI button may have moved the stage since it was cached
+        return self.set_dpi(self.get_dpi_mode(0), value)
 
     @property
     def dpi_mode_count(self) -> int:
-        return self.settings[ADDR_DPI_MODE_CT]
+        return self._current(['dpi_mode_count'])[ADDR_DPI_MODE_CT]
 
-    def get_led_color(self, mode: int) -> str:
+    def get_led_color(self, mode: int, max_age: Optional[float] = None) -> str:
         addrs = ADDR_MODE[mode]
+        settings = self._current([f'mode{mode}_led_color'], max_age)
         return int_to_color(
-            addrs.led_color_r,
-            addrs.led_color_g,
-            addrs.led_color_b,
+            settings[addrs.led_color_r],
+            settings[addrs.led_color_g],
+            settings[addrs.led_color_b],
         )
 
     @property
@@ -528,54 +734,225 @@ class PulsarX2V2Mini:
 
     @led_color.setter
     def led_color(self, color: str):
-        self.set_led_color(self.dpi_mode, color)
-
-    def get_all_settings(self) -> dict:
-        power = self.get_power()
-        
-        modes = []
-        for i in range(self.dpi_mode_count):
-            modes.append({
-                'dpi_mode': i,
-                'led_color': self.get_led_color(i),
-                'dpi': self.get_dpi(i),
-            })
+        self.set_led_color(self.get_dpi_mode(0), color)
 
-        settings = {
-            'dpi_modes': modes,
-            'active_profile': self.profile,
-            'active_dpi_mode': self.dpi_mode,
-            'angle_snapping_enabled': self.angle_snapping,
-            'autosleep_seconds': self.autosleep_time,
-            'debounce_milliseconds': self.debounce_time,
-            'lod': {
-                'mm': self.lod_mm,
-                'ripple_enabled': self.lod_ripple,
-            },
-            'motion_sync_enabled': self.motion_sync,
-            'polling_rate_hz': self.polling_rate,
-        }
-        
-        led = {
-            'enabled': self.led_enabled,
+    def get_dpi_table(self, max_age: Optional[float] = None) -> List[int]:
+        count = self._current(['dpi_mode_count'], max_age)[ADDR_DPI_MODE_CT]
+        # one pass over the contiguous stages, then decoded from the cache
+        self._current([f'mode{mode}_dpi' for mode in range(count)], max_age)
+        return [self.get_dpi(mode, math.inf) for mode in range(count)]
+
+    def set_dpi_table(self, dpis: List[int]):
+        """Set every DPI stage and the number of stages in one transaction"""
+        from .payloads import checksum
+        if not (DPI_MODE_CT_MIN <= len(dpis) <= DPI_MODE_CT_MAX):
+            raise ValueError(f'between {DPI_MODE_CT_MIN} and {DPI_MODE_CT_MAX} DPI stages')
+        target = {
+            ADDR_DPI_MODE_CT: len(dpis),
+            ADDR_DPI_MODE_CT_CHECKSUM: checksum(len(dpis)),
         }
-        if self.led_enabled:
-            led['effect'] = self.led_effect.name.lower() if self.led_effect else None
-            settings['led_color'] = self.led_color
-            if self.led_effect == LEDEffect.BREATHE:
-                led['breathe_speed'] = self.led_breathe_speed
-            elif self.led_effect == LEDEffect.STEADY:
-                led['brightness'] = self.led_brightness
-        else:
-            led['effect'] = None
-        led['effect'] = led.get('effect')
-        settings['led'] = led
-        
+        for mode, dpi in enumerate(dpis):
+            raw = dpi_int_to_raw(dpi)
+            addrs = ADDR_MODE[mode]
+            target.update({
+                addrs.dpi_index1: raw[0],
+                addrs.dpi_index2: raw[1],
+                addrs.dpi_index3: raw[2],
+                addrs.dpi_checksum: checksum(*raw),
+            })
+        if self.get_dpi_mode(0) >= len(dpis):
+            # keep the active stage inside the table
+            target[ADDR_DPI_MODE] = len(dpis) - 1
+            target[ADDR_DPI_MODE_CHECKSUM] = checksum(len(dpis) - 1)
+        # the stages are contiguous, so at most two frames plus one for the count
+        self.write_frames(self.plan(target))
+
+    def get_led_colors(self, max_age: Optional[float] = None) -> List[str]:
+        count = self._current(['dpi_mode_count'], max_age)[ADDR_DPI_MODE_CT]
+        self._current([f'mode{mode}_led_color' for mode in range(count)], max_age)
+        return [self.get_led_color(mode, math.inf) for mode in range(count)]
+
+    def set_led_colors(self, colors: List[str]):
+        """Set the LED color of stages 0..len(colors)-1 in at most two frames"""
+        from .payloads import checksum
+        if len(colors) > len(ADDR_MODE):
+            raise ValueError(f'at most {len(ADDR_MODE)} colors')
+        target = {}
+        for mode, color in enumerate(colors):
+            r, g, b = color_to_int(color)
+            addrs = ADDR_MODE[mode]
+            target.update({
+                addrs.led_color_r: r,
+                addrs.led_color_g: g,
+                addrs.led_color_b: b,
+                addrs.led_color_checksum: checksum(r, g, b),
+            })
+        self.write_frames(self.plan(target))
+
+    def apply(self, state: dict, dry_run: bool = False) -> List[bytearray]:
+        """Bring the mouse to the desired state with the fewest frames possible"""
+        from .payloads import checksum
+        from .state import encode_state
+        rate = state.get('polling_rate_hz')
+        if rate is not None and rate in PollingRateHz and rate not in self.polling_rates:
+            raise ValueError(f'polling_rate_hz must be one of {sorted(self.polling_rates)} on this mouse')
+        payloads = []
+        profile = state.get('active_profile')
+        if profile is not None and profile != self.profile:
+            inst = SetActiveProfilePayload(profile)
+            payloads.append(inst.payload)
+            if not dry_run:
+                self.profile = profile
+
+        target = encode_state(state)
+        count = target.get(ADDR_DPI_MODE_CT)
+        if count is not None and ADDR_DPI_MODE not in target and self.get_dpi_mode(0) >= count:
+            # keep the active stage inside a shorter table, as set_dpi_table() does
+            target[ADDR_DPI_MODE] = count - 1
+            target[ADDR_DPI_MODE_CHECKSUM] = checksum(count - 1)
+        if target:
+            frames = self.plan(target)
+            payloads.extend(build_mem_set_payload(addresses) for addresses in frames)
+            if not dry_run:
+                self.write_frames(frames)
+        return payloads
+
+    def plan(self, target: Dict[int, int]) -> List[Dict[int, int]]:
+        """MEM_SET frames that take the cached image to target"""
+        missing = [a for a in target if a not in self.settings]
+        if missing:
+            self.read_addresses(missing)
+        return plan_mem_set(target, self.settings)
+
+    def write_frames(self, frames: List[Dict[int, int]]):
+        for addresses in frames:
+            self._mem_set(addresses)
+
+    @property
+    def generation(self) -> int:
+        """Changes whenever the cached memory image does"""
+        return self._generation
+
+    def stale_registers(self, max_age: Optional[float] = None) -> List[str]:
+        """Cached registers older than max_age, or than their volatility's TTL"""
+        now = time.monotonic()
+        stale = []
+        for name, read_at in list(self._read_at.items()):
+            if max_age is None:
+                max_age_for = VOLATILITY_TTL[REGISTER_VOLATILITY.get(name, Volatility.STATIC)]
+                if max_age_for is None:
+                    continue
+            else:
+                max_age_for = max_age
+            if now - read_at > max_age_for:
+                stale.append(name)
+        return stale
+
+    def _current(self, names: List[str], max_age: Optional[float] = None) -> Dict[int, int]:
+        """Cached image with the named registers read in if missing or stale"""
+        stale = set(self.stale_registers(max_age))
+        settings = self.settings
+        addresses = [
+            address
+            for name in names
+            for address in range(REGISTERS[name][0], REGISTERS[name][1] + 1)
+            if name in stale or address not in settings
+        ]
+        if addresses:
+            self.read_addresses(addresses)
+        return self.settings
+
+    def refresh(self, max_age: Optional[float] = None):
+        """Re-read only the windows holding stale registers"""
+        stale = self.stale_registers(max_age)
+        if stale:
+            self.read_addresses([
+                address
+                for name in stale
+                for address in range(REGISTERS[name][0], REGISTERS[name][1] + 1)
+            ])
+
+    def snapshot(self, max_age: Optional[float] = None):
+        """Decoded settings, rebuilt only when the memory image changed"""
+        # with the default policy only volatile registers such as the DPI mode
+        # are ever re-read; max_age=math.inf only reads registers not yet
+        # cached, e.g. after switching to a profile never read before
+        from .snapshot import Snapshot
+        self._current(list(REGISTERS), max_age)
+        if self._profile is None:
+            self.read_profile()
+        image = self._image
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.generation != image.generation:
+            # racing readers may both decode; either result is the same
+            snapshot = Snapshot.decode(image.values, image.profile, image.generation)
+            self._snapshot = snapshot
+        return snapshot
+
+    @property
+    def events_dropped(self) -> int:
+        """Device events lost because events() was not consumed fast enough"""
+        return self._events.dropped
+
+    def _decode_event(self, stamp: float, frame) -> Optional[Event]:
+        if frame[1] == Command.MEM_SET:
+            # another program wrote to the mouse, keep the cache in step
+            if not self.settings:
+                self.absorb_write(frame)
+                return None
+            before = self.snapshot(math.inf)
+            self.absorb_write(frame)
+            changes = before.diff(self.snapshot(math.inf))
+            return Event(stamp, None, changes) if changes else None
+        try:
+            payload = from_payload(frame)
+        except (AssertionError, KeyError, NotImplementedError):
+            return None
+        if not isinstance(payload, DeviceEventPayload):
+            return None
+        changes = {}
+        if isinstance(payload, DPIModeDeviceEventPayload):
+            if not self.settings:
+                self.read_settings()
+            before = self.snapshot(math.inf)
+            self.read_addresses([ADDR_DPI_MODE, ADDR_DPI_MODE_CHECKSUM])
+            changes = before.diff(self.snapshot(math.inf))
+        elif isinstance(payload, PowerDeviceEventPayload):
+            changes = {'power': self.get_power()}
+        return Event(stamp, payload, changes)
+
+    def events(self, timeout: Optional[float] = None) -> Iterator[Event]:
+        """Yield device events as they arrive, ending after timeout idle seconds"""
+        # frames are only pulled from the mouse when the consumer asks for the
+        # next event; anything that arrives meanwhile waits in the endpoint
+        idle_since = time.monotonic()
+        while True:
+            queued = self._events.get()
+            if queued is None:
+                if timeout is None:
+                    wait = 1.0
+                else:
+                    wait = timeout - (time.monotonic() - idle_since)
+                    if wait <= 0:
+                        return
+                frame = self.dev.read_frame(max(1, int(wait * 1000)))
+                if frame is None:
+                    continue
+                queued = (time.monotonic(), frame)
+            event = self._decode_event(*queued)
+            if event is not None:
+                yield event
+                idle_since = time.monotonic()
+
+    def aevents(self, timeout: Optional[float] = None):
+        """Async iterator over events(), reading in an executor thread"""
+        return iterate_async(self.events(timeout))
+
+    def get_all_settings(self, max_age: Optional[float] = None) -> dict:
         return {
-            'power': {
-                'connected': power.power_connected,
-                'battery_percent': power.battery_percentage,
-                'battery_millivolts': power.battery_millivoltage,
-            },
-            **settings
+            'power': self.get_power(POWER_TTL if max_age is None else max_age).to_dict(),
+            **self.get_settings(max_age),
         }
+
+    def get_settings(self, max_age: Optional[float] = None) -> dict:
+        return self.snapshot(max_age).to_dict()
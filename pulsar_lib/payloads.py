@@ -1,6 +1,6 @@
 import ctypes
 from dataclasses import dataclass
-from typing import ClassVar
+from typing import ClassVar, Dict, List
 
 from .constants import (
     PAYLOAD_HEADER,
@@ -49,6 +49,49 @@ def build_payload(command, *,
     return bytearray([*payload, checksum(*payload)])
 
 
+MEM_FRAME_LENGTH = 10
+
+
+def build_mem_set_payload(addresses: Dict[int, int]):
+    length = len(addresses)
+    if not (1 <= length <= MEM_FRAME_LENGTH):
+        raise ValueError('must not be longer than 10')
+    start_address = min(addresses)
+    kwargs = {
+        'index04': start_address,
+        'index05': length,
+    }
+    for offset, address in enumerate(range(start_address, start_address+length)):
+        kwargs[f'index{6+offset:02d}'] = addresses[address]
+    return build_payload(Command.MEM_SET, **kwargs)
+
+
+def plan_mem_set(target: Dict[int, int], live: Dict[int, int]) -> List[Dict[int, int]]:
+    """Group the addresses that differ from the live image into MEM_SET frames"""
+    changed = sorted(a for a, v in target.items() if live.get(a) != v)
+    frames = []
+    while changed:
+        start = changed[0]
+        frame = {start: target[start]}
+        for address in range(start + 1, start + MEM_FRAME_LENGTH):
+            if not any(a >= address for a in changed):
+                break
+            # bridge unchanged bytes with their live value to save a frame
+            value = target.get(address, live.get(address))
+            if value is None:
+                break
+            frame[address] = value
+        while frame and max(frame) not in changed:
+            del frame[max(frame)]
+        frames.append(frame)
+        changed = [a for a in changed if a not in frame]
+    return frames
+
+
+def format_payload(payload):
+    return ':'.join(f'{b:02x}' for b in payload)
+
+
 class Payload:
     payload: ClassVar[bytearray]
     
@@ -142,14 +185,24 @@ class DeviceEventPayload(Payload):
 
 
 class Unknown1DeviceEventPayload(DeviceEventPayload):
+    """
+    Unknown event
+    """
     EVENT_FUNCTION = DeviceEvent.UNKNOWN_1
 
 
 class DPIModeDeviceEventPayload(DeviceEventPayload):
+    """
+    DPI mode button was pressed
+    """
     EVENT_FUNCTION = DeviceEvent.DPI_MODE
 
 
 class PowerDeviceEventPayload(DeviceEventPayload):
+    """
+    A power event occurred, but the device is not currently configured to
+    report specific details
+    """
     EVENT_FUNCTION = DeviceEvent.POWER
 
 
@@ -214,6 +267,13 @@ class PowerDetails:
     battery_millivoltage: int
     power_connected: bool
 
+    def to_dict(self) -> dict:
+        return {
+            'connected': self.power_connected,
+            'battery_percent': self.battery_percentage,
+            'battery_millivolts': self.battery_millivoltage,
+        }
+
 
 def parse_power_details(data):
     return PowerDetails(
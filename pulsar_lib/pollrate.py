@@ -0,0 +1,172 @@
+import os
+import select
+import time
+from array import array
+from typing import List, NamedTuple, Optional, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .capture import RecordingDevice
+from .constants import INTERFACES
+from .device import Device, usb
+from .hidraw import HidrawDevice, sibling_hidraw_node
+
+
+MOTION_INTERFACE = 0
+
+# highest rate a recording is sized for, with headroom for bursts
+RECORD_MAX_HZ = 8000
+
+# an interval this many report periods long means the mouse stood still
+IDLE_PERIODS = 8
+
+# measured rate within this fraction of the configured one counts as a match
+RATE_TOLERANCE = 0.05
+
+# interval histogram edges, in report periods of the configured rate
+HISTOGRAM_PERIODS = (0, 0.5, 0.9, 1.1, 1.5, 2.5, IDLE_PERIODS)
+
+
+class HidrawReportSource:
+    """Interface 0 input reports from /dev/hidrawN, the pointer keeps working"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self, timeout: float) -> Optional[bytes]:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return None
+        return os.read(self.fd, 64)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class UsbReportSource:
+    """Interface 0 through libusb, the pointer is frozen while this is open"""
+
+    def __init__(self, device):
+        self.device = device
+        self.endpoint = INTERFACES[MOTION_INTERFACE]['endpoint']
+        self.length = INTERFACES[MOTION_INTERFACE]['length']
+        self.reattach = False
+        if device.is_kernel_driver_active(MOTION_INTERFACE):
+            device.detach_kernel_driver(MOTION_INTERFACE)
+            self.reattach = True
+        usb.util.claim_interface(device, MOTION_INTERFACE)
+
+    def read(self, timeout: float) -> Optional[bytes]:
+        try:
+            return self.device.read(self.endpoint, self.length,
+                                    timeout=max(1, int(timeout * 1000))).tobytes()
+        except usb.core.USBTimeoutError:
+            return None
+
+    def close(self):
+        usb.util.release_interface(self.device, MOTION_INTERFACE)
+        if self.reattach:
+            self.device.attach_kernel_driver(MOTION_INTERFACE)
+            self.reattach = False
+
+
+def open_report_source(dev):
+    """Motion report source on the same mouse as an open Device or HidrawDevice"""
+    # a capture wrapper records interface 1 only, measure the mouse behind it
+    while isinstance(dev, RecordingDevice):
+        dev = dev.dev
+    if isinstance(dev, HidrawDevice):
+        path = sibling_hidraw_node(dev.path, MOTION_INTERFACE)
+        if path is None:
+            raise RuntimeError(f'no hidraw node for interface {MOTION_INTERFACE} next to {dev.path}')
+        return HidrawReportSource(path)
+    if isinstance(dev, Device):
+        return UsbReportSource(dev.device)
+    raise RuntimeError('measuring the polling rate needs a live mouse')
+
+
+def record(source, seconds: float, capacity: Optional[int] = None) -> array:
+    """time.monotonic_ns() of each report that arrives within seconds"""
+    if capacity is None:
+        capacity = int(seconds * RECORD_MAX_HZ) + 1
+    # allocated up front so the loop only stores integers
+    times = array('q', bytes(8 * capacity))
+    read = source.read
+    clock = time.monotonic_ns
+    deadline = clock() + int(seconds * 1e9)
+    n = 0
+    while n < capacity:
+        remaining = deadline - clock()
+        if remaining <= 0:
+            break
+        if read(min(remaining / 1e9, 0.1)) is not None:
+            times[n] = clock()
+            n += 1
+    del times[n:]
+    return times
+
+
+class RateReport(NamedTuple):
+    """Measured report delivery against the configured polling rate"""
+    configured_hz: int
+    reports: int
+    active_seconds: float
+    effective_hz: float
+    interval_p50_us: float
+    interval_p99_us: float
+    jitter_us: float
+    jitter_p50_us: float
+    jitter_p99_us: float
+    dropped: int
+    loss: float
+    histogram: List[Tuple[str, int]]
+
+    @property
+    def matches(self) -> bool:
+        return abs(self.effective_hz - self.configured_hz) <= self.configured_hz * RATE_TOLERANCE
+
+
+def analysis_available() -> bool:
+    return numpy is not None
+
+
+def analyze(times, configured_hz: int) -> RateReport:
+    """Interval statistics of a record() result, needs NumPy"""
+    if numpy is None:
+        raise RuntimeError('polling rate analysis needs the numpy package')
+    period_us = 1e6 / configured_hz
+    intervals = numpy.diff(numpy.frombuffer(times, dtype=numpy.int64)) / 1e3
+    # gaps where the mouse was not moving say nothing about the rate
+    active = intervals[intervals < IDLE_PERIODS * period_us]
+    if active.size < 2:
+        raise RuntimeError('too few reports while moving, keep the mouse moving while recording')
+    edges = numpy.array(HISTOGRAM_PERIODS) * period_us
+    counts, _ = numpy.histogram(active, bins=edges)
+    labels = [f'{lo:g}-{hi:g}' for lo, hi in zip(HISTOGRAM_PERIODS, HISTOGRAM_PERIODS[1:])]
+    span_us = float(active.sum())
+    # host timestamps bunch reports read together, but not the total span,
+    # so losses are counted against the number of periods that went by
+    dropped = max(int(round(span_us / period_us)) - active.size, 0)
+    p50, p99 = numpy.percentile(active, [50, 99])
+    # distance of each interval from the ideal period
+    jitter_p50, jitter_p99 = numpy.percentile(numpy.abs(active - period_us), [50, 99])
+    return RateReport(
+        configured_hz=configured_hz,
+        reports=len(times),
+        active_seconds=span_us / 1e6,
+        effective_hz=active.size / span_us * 1e6,
+        interval_p50_us=float(p50),
+        interval_p99_us=float(p99),
+        jitter_us=float(active.std()),
+        jitter_p50_us=float(jitter_p50),
+        jitter_p99_us=float(jitter_p99),
+        dropped=dropped,
+        loss=dropped / (active.size + dropped),
+        histogram=list(zip(labels, counts.tolist())),
+    )
@@ -0,0 +1,125 @@
+import enum
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from .constants import Command
+from .device import BaseDevice
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE_WRITE = 0
+    INTERACTIVE_READ = 1
+    BACKGROUND = 2
+
+
+# commands that change the mouse are user actions unless a caller says otherwise
+WRITE_COMMANDS = {
+    Command.MEM_SET,
+    Command.ACTIVE_PROFILE_SET,
+    Command.RESTORE,
+}
+
+_priority: ContextVar[Optional[Priority]] = ContextVar('pulsar_priority', default=None)
+
+
+class CommandScheduler:
+    """Hands the device to one request/reply exchange at a time, best priority first"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._tickets = itertools.count()
+        self._owner = None
+        self._depth = 0
+
+    @contextmanager
+    def slot(self, priority: Priority):
+        me = threading.get_ident()
+        with self._cond:
+            if self._owner == me:
+                self._depth += 1
+            else:
+                ticket = (int(priority), next(self._tickets))
+                heapq.heappush(self._waiting, ticket)
+                while self._owner is not None or self._waiting[0] != ticket:
+                    self._cond.wait()
+                heapq.heappop(self._waiting)
+                self._owner = me
+                self._depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._owner = None
+                    self._cond.notify_all()
+
+
+class ScheduledDevice(BaseDevice):
+    """Share one device between threads, preempting between frames rather than operations"""
+
+    def __init__(self, dev: BaseDevice, scheduler: Optional[CommandScheduler] = None):
+        self.dev = dev
+        self.lock = dev.lock
+        self.scheduler = scheduler or CommandScheduler()
+
+    @staticmethod
+    @contextmanager
+    def priority(priority: Priority):
+        """Run the enclosed calls at priority, e.g. BACKGROUND for pollers"""
+        token = _priority.set(priority)
+        try:
+            yield
+        finally:
+            _priority.reset(token)
+
+    def _slot(self, command=None):
+        priority = _priority.get()
+        if priority is None:
+            if command in WRITE_COMMANDS:
+                priority = Priority.INTERACTIVE_WRITE
+            else:
+                priority = Priority.INTERACTIVE_READ
+        return self.scheduler.slot(priority)
+
+    def request(self, payload, command=None):
+        payload = bytes(payload)
+        with self._slot(payload[1]):
+            return self.dev.request(payload, command)
+
+    def hold(self):
+        return self._slot()
+
+    def write(self, payload):
+        payload = bytes(payload)
+        with self._slot(payload[1]):
+            self.dev.write(payload)
+
+    def _read(self):
+        with self._slot():
+            return self.dev._read()
+
+    def read_frame(self, timeout):
+        deadline = time.monotonic() + timeout / 1000
+        while True:
+            remaining = int((deadline - time.monotonic()) * 1000)
+            with self._slot():
+                frame = self.dev.read_frame(max(1, min(remaining, self.READ_FRAME_SLICE_MS)))
+            if frame is not None or remaining <= self.READ_FRAME_SLICE_MS:
+                return frame
+
+    def clear_read_buffer(self):
+        with self._slot():
+            return self.dev.clear_read_buffer()
+
+    def is_connected(self):
+        return self.dev.is_connected()
+
+    def close(self):
+        self.dev.close()
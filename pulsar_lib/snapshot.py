@@ -0,0 +1,137 @@
+import json
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from .constants import (
+    ADDR_ANGLE_SNAPPING,
+    ADDR_AUTOSLEEP_TIME,
+    ADDR_DEBOUNCE_TIME,
+    ADDR_DPI_MODE,
+    ADDR_DPI_MODE_CT,
+    ADDR_LED_BREATHE_SPEED,
+    ADDR_LED_BRIGHTNESS,
+    ADDR_LED_EFFECT,
+    ADDR_LED_ENABLED,
+    ADDR_LOD_MM,
+    ADDR_LOD_RIPPLE,
+    ADDR_MOTION_SYNC,
+    ADDR_POLLING_RATE,
+    LEDEffect,
+    PollingRateHz,
+)
+from .mouse import ADDR_MODE, dpi_raw_to_int, int_to_color, inverse
+
+
+POLLING_RATES = inverse(PollingRateHz)
+LED_EFFECTS = {effect.value: effect.name.lower() for effect in LEDEffect}
+
+
+class DPIMode(NamedTuple):
+    dpi_mode: int
+    led_color: str
+    dpi: int
+
+
+class Snapshot(NamedTuple):
+    """Immutable view of one memory image, decoded in a single pass"""
+    generation: int
+    profile: Optional[int]
+    polling_rate: int
+    dpi_mode: int
+    dpi_modes: Tuple[DPIMode, ...]
+    angle_snapping: bool
+    autosleep_time: int
+    debounce_time: int
+    lod_mm: int
+    lod_ripple: bool
+    motion_sync: bool
+    led_enabled: bool
+    led_effect: Optional[str]
+    led_brightness: int
+    led_breathe_speed: int
+
+    @classmethod
+    def decode(cls, image: Dict[int, int], profile: Optional[int] = None,
+               generation: int = 0) -> 'Snapshot':
+        modes = []
+        for i in range(image[ADDR_DPI_MODE_CT]):
+            addrs = ADDR_MODE[i]
+            modes.append(DPIMode(
+                dpi_mode=i,
+                led_color=int_to_color(
+                    image[addrs.led_color_r],
+                    image[addrs.led_color_g],
+                    image[addrs.led_color_b],
+                ),
+                dpi=dpi_raw_to_int((
+                    image[addrs.dpi_index1],
+                    image[addrs.dpi_index2],
+                    image[addrs.dpi_index3],
+                )),
+            ))
+        return cls(
+            generation=generation,
+            profile=profile,
+            polling_rate=POLLING_RATES[image[ADDR_POLLING_RATE]],
+            dpi_mode=image[ADDR_DPI_MODE],
+            dpi_modes=tuple(modes),
+            angle_snapping=bool(image[ADDR_ANGLE_SNAPPING]),
+            autosleep_time=image[ADDR_AUTOSLEEP_TIME] * 10,
+            debounce_time=image[ADDR_DEBOUNCE_TIME],
+            lod_mm=image[ADDR_LOD_MM],
+            lod_ripple=bool(image[ADDR_LOD_RIPPLE]),
+            motion_sync=bool(image[ADDR_MOTION_SYNC]),
+            led_enabled=bool(image[ADDR_LED_ENABLED]),
+            led_effect=LED_EFFECTS.get(image[ADDR_LED_EFFECT]),
+            led_brightness=image[ADDR_LED_BRIGHTNESS],
+            led_breathe_speed=image[ADDR_LED_BREATHE_SPEED],
+        )
+
+    @property
+    def led_color(self) -> Optional[str]:
+        for mode in self.dpi_modes:
+            if mode.dpi_mode == self.dpi_mode:
+                return mode.led_color
+        return None
+
+    def diff(self, other: 'Snapshot') -> Dict[str, object]:
+        """Fields whose value differs in other, mapped to the new value"""
+        if other is self:
+            return {}
+        return {
+            field: new
+            for field, old, new in zip(self._fields, self, other)
+            if field != 'generation' and old != new
+        }
+
+    def to_dict(self) -> dict:
+        """Same layout as PulsarX2V2Mini.get_settings() always produced"""
+        settings = {
+            'dpi_modes': [mode._asdict() for mode in self.dpi_modes],
+            'active_profile': self.profile,
+            'active_dpi_mode': self.dpi_mode,
+            'angle_snapping_enabled': self.angle_snapping,
+            'autosleep_seconds': self.autosleep_time,
+            'debounce_milliseconds': self.debounce_time,
+            'lod': {
+                'mm': self.lod_mm,
+                'ripple_enabled': self.lod_ripple,
+            },
+            'motion_sync_enabled': self.motion_sync,
+            'polling_rate_hz': self.polling_rate,
+        }
+        led = {
+            'enabled': self.led_enabled,
+            'effect': None,
+        }
+        if self.led_enabled:
+            led['effect'] = self.led_effect
+            settings['led_color'] = self.led_color
+            if self.led_effect == 'breathe':
+                led['breathe_speed'] = self.led_breathe_speed
+            elif self.led_effect == 'steady':
+                led['brightness'] = self.led_brightness
+        settings['led'] = led
+        return settings
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), sort_keys=True, **kwargs)
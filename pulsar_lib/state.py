@@ -0,0 +1,148 @@
+import re
+from typing import Dict
+
+from .constants import (
+    ADDR_ANGLE_SNAPPING,
+    ADDR_AUTOSLEEP_TIME,
+    ADDR_DEBOUNCE_TIME,
+    ADDR_DPI_MODE,
+    ADDR_DPI_MODE_CT,
+    ADDR_LED_BREATHE_SPEED,
+    ADDR_LED_BRIGHTNESS,
+    ADDR_LED_EFFECT,
+    ADDR_LED_ENABLED,
+    ADDR_LOD_MM,
+    ADDR_LOD_RIPPLE,
+    ADDR_MOTION_SYNC,
+    ADDR_POLLING_RATE,
+    AUTOSLEEP_TIME_MAX,
+    AUTOSLEEP_TIME_MIN,
+    DEBOUNCE_TIME_MAX,
+    DEBOUNCE_TIME_MIN,
+    DPI_MODE_CT_MAX,
+    DPI_MODE_CT_MIN,
+    DPI_MODE_MAX,
+    DPI_MODE_MIN,
+    DPI_MAX,
+    DPI_MIN,
+    LED_BREATHE_SPEED_MAX,
+    LED_BREATHE_SPEED_MIN,
+    LED_BRIGHTNESS_MAX,
+    LED_BRIGHTNESS_MIN,
+    LOD_MM_MAX,
+    LOD_MM_MIN,
+    LEDEffect,
+    PollingRateHz,
+)
+from .mouse import ADDR_MODE, color_to_int, dpi_int_to_raw
+from .payloads import checksum
+
+
+# keys of get_all_settings() that describe the device rather than a setting
+READ_ONLY_KEYS = {
+    'power',
+    'led_color',
+}
+
+
+def _field(image, address, *values):
+    for offset, value in enumerate(values):
+        image[address + offset] = int(value)
+    image[address + len(values)] = checksum(*values)
+
+
+def _ranged(name, value, minimum, maximum):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f'{name} must be an integer')
+    if not (minimum <= value <= maximum):
+        raise ValueError(f'{name} must be between {minimum} and {maximum}')
+    return value
+
+
+def _table(name, value):
+    if not isinstance(value, dict):
+        raise ValueError(f'{name} must be a table')
+    return value
+
+
+def _color(name, value):
+    if not isinstance(value, str) or not re.fullmatch(r'#?[0-9a-fA-F]{6}', value):
+        raise ValueError(f'{name} must be a color like #rrggbb')
+    return value
+
+
+def encode_state(state: dict) -> Dict[int, int]:
+    """Translate a get_all_settings()-shaped dict into the memory image it implies"""
+    image: Dict[int, int] = {}
+    for key, value in state.items():
+        if key in READ_ONLY_KEYS or key == 'active_profile':
+            continue
+        elif key == 'polling_rate_hz':
+            if not isinstance(value, int) or isinstance(value, bool) or value not in PollingRateHz:
+                raise ValueError(f'polling_rate_hz must be one of {sorted(PollingRateHz)}')
+            _field(image, ADDR_POLLING_RATE, PollingRateHz[value])
+        elif key == 'active_dpi_mode':
+            _field(image, ADDR_DPI_MODE,
+                   _ranged(key, value, DPI_MODE_MIN, DPI_MODE_MAX))
+        elif key == 'dpi_modes':
+            if not isinstance(value, list):
+                raise ValueError('dpi_modes must be a list of tables')
+            _ranged('number of dpi_modes', len(value), DPI_MODE_CT_MIN, DPI_MODE_CT_MAX)
+            _field(image, ADDR_DPI_MODE_CT, len(value))
+            for i, mode in enumerate(value):
+                mode = _table(f'dpi_modes[{i}]', mode)
+                addrs = ADDR_MODE[_ranged(f'dpi_modes[{i}].dpi_mode', mode.get('dpi_mode', i),
+                                          DPI_MODE_MIN, DPI_MODE_MAX)]
+                if 'dpi' in mode:
+                    dpi = _ranged(f'dpi_modes[{i}].dpi', mode['dpi'], DPI_MIN, DPI_MAX)
+                    _field(image, addrs.dpi_index1, *dpi_int_to_raw(dpi))
+                if 'led_color' in mode:
+                    color = _color(f'dpi_modes[{i}].led_color', mode['led_color'])
+                    _field(image, addrs.led_color_r, *color_to_int(color))
+        elif key == 'angle_snapping_enabled':
+            _field(image, ADDR_ANGLE_SNAPPING, bool(value))
+        elif key == 'motion_sync_enabled':
+            _field(image, ADDR_MOTION_SYNC, bool(value))
+        elif key == 'debounce_milliseconds':
+            _field(image, ADDR_DEBOUNCE_TIME,
+                   _ranged(key, value, DEBOUNCE_TIME_MIN, DEBOUNCE_TIME_MAX))
+        elif key == 'autosleep_seconds':
+            _ranged(key, value, 0, AUTOSLEEP_TIME_MAX * 10)
+            if value % 10:
+                raise ValueError('autosleep_seconds must be a multiple of 10')
+            _field(image, ADDR_AUTOSLEEP_TIME,
+                   _ranged('autosleep_seconds / 10', value // 10,
+                           AUTOSLEEP_TIME_MIN, AUTOSLEEP_TIME_MAX))
+        elif key == 'lod':
+            _table(key, value)
+            if 'mm' in value:
+                _field(image, ADDR_LOD_MM,
+                       _ranged('lod.mm', value['mm'], LOD_MM_MIN, LOD_MM_MAX))
+            if 'ripple_enabled' in value:
+                _field(image, ADDR_LOD_RIPPLE, bool(value['ripple_enabled']))
+        elif key == 'led':
+            _table(key, value)
+            effect = value.get('effect')
+            if effect is not None and not isinstance(effect, str):
+                raise ValueError('led.effect must be a name like "steady" or "off"')
+            if effect not in (None, 'off'):
+                if effect.upper() not in LEDEffect.__members__:
+                    raise ValueError(f'unknown LED effect {effect!r}')
+                _field(image, ADDR_LED_EFFECT, LEDEffect[effect.upper()])
+            if 'enabled' in value or 'effect' in value:
+                enabled = value.get('enabled', effect not in (None, 'off'))
+                _field(image, ADDR_LED_ENABLED, bool(enabled))
+            if 'brightness' in value:
+                _field(image, ADDR_LED_BRIGHTNESS,
+                       _ranged('led.brightness', value['brightness'],
+                               LED_BRIGHTNESS_MIN, LED_BRIGHTNESS_MAX))
+            if 'breathe_speed' in value:
+                _field(image, ADDR_LED_BREATHE_SPEED,
+                       _ranged('led.breathe_speed', value['breathe_speed'],
+                               LED_BREATHE_SPEED_MIN, LED_BREATHE_SPEED_MAX))
+        else:
+            raise ValueError(f'unknown setting {key!r}')
+    if 'active_dpi_mode' in state and 'dpi_modes' in state:
+        if state['active_dpi_mode'] >= len(state['dpi_modes']):
+            raise ValueError('active_dpi_mode must be one of the dpi_modes')
+    return image
@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+
+# upper bounds in seconds for the round-trip histogram, +Inf is implied
+RTT_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class TransportStats:
+    """Frame counters and round-trip times kept by a device as it talks to the mouse"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.frames_sent = Counter()
+        self.frames_received = Counter()
+        self.timeouts = 0
+        self.rtt_buckets = [0] * len(RTT_BUCKETS)
+        self.rtt_count = 0
+        self.rtt_sum = 0.0
+        # command byte -> perf_counter() of the latest unanswered request
+        self._pending: Dict[int, float] = {}
+
+    def sent(self, frame):
+        command = frame[1]
+        with self._lock:
+            self.frames_sent[command] += 1
+            self._pending[command] = time.perf_counter()
+
+    def received(self, frame):
+        command = frame[1]
+        now = time.perf_counter()
+        with self._lock:
+            self.frames_received[command] += 1
+            started = self._pending.pop(command, None)
+            if started is not None:
+                self._observe(now - started)
+
+    def timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+            self._pending.clear()
+
+    def _observe(self, seconds):
+        self.rtt_count += 1
+        self.rtt_sum += seconds
+        for i, bound in enumerate(RTT_BUCKETS):
+            if seconds <= bound:
+                self.rtt_buckets[i] += 1
+                break
+
+    def snapshot(self) -> dict:
+        """Consistent copy of every counter, safe to read from another thread"""
+        with self._lock:
+            return {
+                'frames_sent': dict(self.frames_sent),
+                'frames_received': dict(self.frames_received),
+                'timeouts': self.timeouts,
+                'rtt_buckets': list(self.rtt_buckets),
+                'rtt_count': self.rtt_count,
+                'rtt_sum': self.rtt_sum,
+            }
+
+
+def device_stats(dev) -> Optional[TransportStats]:
+    """Find the stats of a device, looking through capture wrappers"""
+    while dev is not None:
+        stats = getattr(dev, 'stats', None)
+        if stats is not None:
+            return stats
+        dev = getattr(dev, 'dev', None)
+    return None
@@ -0,0 +1,42 @@
+"""
+Pulsar Mouse Tool - persisted service cache
+Lets a freshly activated service answer before it has read the mouse
+"""
+
+import json
+import os
+import tempfile
+from typing import Optional
+
+
+def default_cache_path() -> str:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'pulsar', 'pulsard.json')
+
+
+def load_cache(path: str) -> Optional[dict]:
+    """Last published settings, None if there are none or they are unreadable"""
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or 'power' not in cache:
+        return None
+    # whatever was true at exit, the mouse is not open yet
+    cache['connected'] = False
+    return cache
+
+
+def save_cache(path: str, cache: dict):
+    """Replace path atomically so a crash never leaves half a file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.pulsard', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f, sort_keys=True)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
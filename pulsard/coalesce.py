@@ -0,0 +1,48 @@
+import time
+
+
+_NOTHING = object()
+
+
+class Coalescer:
+    """Latest-value-wins rate limiter for writes to a single field"""
+
+    def __init__(self, write, interval=0.05, schedule=None, clock=time.monotonic):
+        self.write = write
+        self.interval = interval
+        # schedule(delay_seconds, callback) runs callback once after the delay
+        self.schedule = schedule
+        self.clock = clock
+        self._pending = _NOTHING
+        self._last_write = None
+        self._timer_armed = False
+
+    @property
+    def pending(self) -> bool:
+        return self._pending is not _NOTHING
+
+    def submit(self, value):
+        """Write now if the field is idle, otherwise replace the queued value"""
+        self._pending = value
+        if self._timer_armed:
+            return
+        delay = 0
+        if self._last_write is not None:
+            delay = self._last_write + self.interval - self.clock()
+        if delay <= 0:
+            self.flush()
+        else:
+            self._timer_armed = True
+            self.schedule(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer_armed = False
+        self.flush()
+
+    def flush(self):
+        """Write the queued value, if any"""
+        if self._pending is _NOTHING:
+            return
+        value, self._pending = self._pending, _NOTHING
+        self._last_write = self.clock()
+        self.write(value)
@@ -0,0 +1,134 @@
+"""
+Pulsar Mouse Tool - OpenMetrics exporter
+Renders the service cache and transport counters without touching the mouse
+"""
+
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pulsar_lib.constants import Command
+from pulsar_lib.stats import RTT_BUCKETS
+
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+def _command_name(command):
+    try:
+        return Command(command).name.lower()
+    except ValueError:
+        return f'0x{command:02x}'
+
+
+def _bool(value):
+    return 1 if value else 0
+
+
+def render(cache, stats=None) -> str:
+    """Format a get_all_settings()-shaped cache and a stats snapshot as OpenMetrics text"""
+    lines = []
+
+    def metric(name, kind, help, samples):
+        lines.append(f'# TYPE pulsar_{name} {kind}')
+        lines.append(f'# HELP pulsar_{name} {help}')
+        for suffix, labels, value in samples:
+            label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            if label_text:
+                label_text = '{' + label_text + '}'
+            lines.append(f'pulsar_{name}{suffix}{label_text} {value}')
+
+    metric('up', 'gauge', 'Whether the service has the mouse open',
+           [('', {}, _bool(cache.get('connected')))])
+
+    power = cache.get('power')
+    if cache.get('connected') and power:
+        metric('battery_percent', 'gauge', 'Battery charge reported by the mouse',
+               [('', {}, power['battery_percent'])])
+        metric('battery_millivolts', 'gauge', 'Battery voltage reported by the mouse',
+               [('', {}, power['battery_millivolts'])])
+        metric('charging', 'gauge', 'Whether the mouse is on external power',
+               [('', {}, _bool(power['connected']))])
+    if cache.get('connected') and 'polling_rate_hz' in cache:
+        metric('polling_rate_hz', 'gauge', 'Configured polling rate',
+               [('', {}, cache['polling_rate_hz'])])
+        metric('dpi_mode', 'gauge', 'Active DPI mode',
+               [('', {}, cache['active_dpi_mode'])])
+        metric('profile', 'gauge', 'Active onboard profile',
+               [('', {}, cache['active_profile'])])
+
+    if stats is not None:
+        metric('frames_sent', 'counter', 'Frames written to the mouse by command',
+               [('_total', {'command': _command_name(c)}, n)
+                for c, n in sorted(stats['frames_sent'].items())])
+        metric('frames_received', 'counter', 'Frames read from the mouse by command',
+               [('_total', {'command': _command_name(c)}, n)
+                for c, n in sorted(stats['frames_received'].items())])
+        metric('read_timeouts', 'counter', 'Reads that expected a reply and got none',
+               [('_total', {}, stats['timeouts'])])
+        samples = []
+        cumulative = 0
+        for bound, n in zip(RTT_BUCKETS, stats['rtt_buckets']):
+            cumulative += n
+            samples.append(('_bucket', {'le': repr(bound)}, cumulative))
+        samples.append(('_bucket', {'le': '+Inf'}, stats['rtt_count']))
+        samples.append(('_count', {}, stats['rtt_count']))
+        samples.append(('_sum', {}, repr(stats['rtt_sum'])))
+        metric('rtt_seconds', 'histogram', 'Time from a request frame to its reply',
+               samples)
+
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(render, port=None, socket_path=None, listen_fd=None):
+    """Serve render() over HTTP on localhost:port, a Unix socket or an inherited one, in a thread"""
+    if listen_fd is not None:
+        # already bound and listening, e.g. passed in by systemd
+        server = _UnixHTTPServer(None, _Handler, bind_and_activate=False)
+        server.socket = socket.socket(fileno=listen_fd)
+        server.server_address = server.socket.getsockname()
+    elif socket_path is not None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixHTTPServer(socket_path, _Handler)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        server.daemon_threads = True
+    server.render = render
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_textfile(path, text):
+    """Replace path atomically so node_exporter never reads half a file"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                               prefix='.pulsar', suffix='.prom')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
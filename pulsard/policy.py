@@ -0,0 +1,148 @@
+"""
+Pulsar Mouse Tool - battery power policy
+Trades LEDs, polling rate and autosleep for runtime as the battery drains
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+
+from pulsar_lib.payloads import PowerDetails
+from pulsar_lib.state import encode_state
+
+from pulsard.rules import load_config
+
+
+# percent the battery has to climb back above a level's threshold
+# before the level is left, so readings around it never flap
+HYSTERESIS_PERCENT = 5
+
+
+class PowerLevel(NamedTuple):
+    """Settings to apply while on battery at or below below_percent"""
+    below_percent: int
+    release_percent: Optional[int] = None
+    led_enabled: Optional[bool] = None
+    polling_rate: Optional[int] = None
+    autosleep_seconds: Optional[int] = None
+
+    @property
+    def release(self) -> int:
+        if self.release_percent is None:
+            return self.below_percent + HYSTERESIS_PERCENT
+        return self.release_percent
+
+    def state(self, polling_rates) -> dict:
+        """Settings in get_all_settings() layout, leaving out rates the mouse lacks"""
+        state = {}
+        if self.led_enabled is not None:
+            state['led'] = {'enabled': self.led_enabled}
+        if self.polling_rate is not None and self.polling_rate in polling_rates:
+            state['polling_rate_hz'] = self.polling_rate
+        if self.autosleep_seconds is not None:
+            state['autosleep_seconds'] = self.autosleep_seconds
+        return state
+
+
+def parse_policy(data: dict) -> List[PowerLevel]:
+    """Validate the [[power]] tables of a policy file, highest threshold first"""
+    levels = []
+    for entry in data.get('power', []):
+        unknown = set(entry) - set(PowerLevel._fields)
+        if unknown:
+            raise ValueError(f'unknown power keys: {", ".join(sorted(unknown))}')
+        level = PowerLevel(**entry)
+        if not (0 <= level.below_percent <= 100):
+            raise ValueError('below_percent must be between 0 and 100')
+        if level.release <= level.below_percent:
+            raise ValueError('release_percent must be above below_percent')
+        # same checks as a settings file
+        encode_state(level.state([level.polling_rate]))
+        levels.append(level)
+    return sorted(levels, key=lambda level: level.below_percent, reverse=True)
+
+
+def load_policy(path: str) -> List[PowerLevel]:
+    return parse_policy(load_config(path))
+
+
+class PowerPolicy:
+    """Moves the mouse between power levels, restoring the user's settings on the charger"""
+
+    def __init__(self, levels: List[PowerLevel]):
+        self.levels = levels
+        self.active: Optional[PowerLevel] = None
+        # the user's values of every register the policy touches, saved
+        # when leaving normal operation; kept across reconnects
+        self.preferred: Dict[int, int] = {}
+
+    def level_for(self, power: PowerDetails) -> Optional[PowerLevel]:
+        if power.power_connected:
+            return None
+        percent = power.battery_percentage
+        entered = None
+        for level in self.levels:
+            if percent <= level.below_percent:
+                entered = level
+        active = self.active
+        if active is not None and (entered is None or entered.below_percent > active.below_percent):
+            # going up a level only once the battery is clear of this one
+            if percent < active.release:
+                return active
+        return entered
+
+    def target(self, mouse, level: Optional[PowerLevel]) -> Dict[int, int]:
+        """Image for level: lower levels add to the ones above them, None is the user's"""
+        image = dict(self.preferred)
+        if level is not None:
+            for other in self.levels:
+                if other.below_percent >= level.below_percent:
+                    image.update(encode_state(other.state(mouse.polling_rates)))
+        return image
+
+    def remember(self, mouse) -> bool:
+        """Keep what the user changed while a level is active for the way back, True if anything was"""
+        if self.active is None:
+            return False
+        target = self.target(mouse, self.active)
+        changed = False
+        for address in self.preferred:
+            value = mouse.settings.get(address)
+            if value is not None and value != target[address] and value != self.preferred[address]:
+                self.preferred[address] = value
+                changed = True
+        return changed
+
+    def state(self) -> dict:
+        """The active level and the user's values, for restore() after a restart"""
+        return {
+            'active_below_percent': None if self.active is None else self.active.below_percent,
+            # JSON object keys are strings
+            'preferred': {str(address): value for address, value in self.preferred.items()},
+        }
+
+    def restore(self, state: dict):
+        self.preferred = {int(address): value for address, value in state.get('preferred', {}).items()}
+        below = state.get('active_below_percent')
+        self.active = next((level for level in self.levels if level.below_percent == below), None)
+
+    def update(self, mouse, power: PowerDetails) -> bool:
+        """Apply the level for a power reading, True if the mouse was written"""
+        level = self.level_for(power)
+        # values restored for a level the policy no longer has still go back
+        if level == self.active and not (level is None and self.preferred):
+            return False
+        if self.active is None:
+            touched = set()
+            for other in self.levels:
+                touched.update(encode_state(other.state(mouse.polling_rates)))
+            missing = [address for address in touched if address not in mouse.settings]
+            if missing:
+                mouse.read_addresses(missing)
+            # saved before a restart, the mouse holds a level's values now
+            self.preferred = {address: self.preferred.get(address, mouse.settings[address])
+                              for address in touched}
+        # one plan for the whole transition, adjacent registers share a frame
+        mouse.write_frames(mouse.plan(self.target(mouse, level)))
+        self.active = level
+        if level is None:
+            self.preferred = {}
+        return True
@@ -0,0 +1,253 @@
+"""
+Pulsar Mouse Tool - per-application rules
+Switches DPI, polling rate or profile when the focused application changes
+"""
+
+import fnmatch
+import json
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from pulsar_lib.constants import (
+    ADDR_DPI_MODE,
+    ADDR_DPI_MODE_CHECKSUM,
+    ADDR_POLLING_RATE,
+    ADDR_POLLING_RATE_CHECKSUM,
+    DPI_MODE_MAX,
+    DPI_MODE_MIN,
+    PollingRateHz,
+)
+from pulsar_lib.mouse import ADDR_MODE, dpi_int_to_raw
+from pulsar_lib.payloads import checksum
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+class Rule(NamedTuple):
+    """Settings to apply while an application whose id matches the glob has focus"""
+    match: str
+    profile: Optional[int] = None
+    dpi_mode: Optional[int] = None
+    dpi: Optional[int] = None
+    polling_rate: Optional[int] = None
+
+    def target(self, active_dpi_mode: int) -> Dict[int, int]:
+        """Memory image the rule implies, as set_dpi/dpi_mode/polling_rate would write it"""
+        image = {}
+        if self.polling_rate is not None:
+            value = int(PollingRateHz[self.polling_rate])
+            image[ADDR_POLLING_RATE] = value
+            image[ADDR_POLLING_RATE_CHECKSUM] = checksum(value)
+        if self.dpi_mode is not None:
+            image[ADDR_DPI_MODE] = self.dpi_mode
+            image[ADDR_DPI_MODE_CHECKSUM] = checksum(self.dpi_mode)
+        if self.dpi is not None:
+            # without a stage the rule retunes whichever stage is active
+            stage = active_dpi_mode if self.dpi_mode is None else self.dpi_mode
+            addrs = ADDR_MODE[stage]
+            raw = dpi_int_to_raw(self.dpi)
+            image[addrs.dpi_index1] = raw[0]
+            image[addrs.dpi_index2] = raw[1]
+            image[addrs.dpi_index3] = raw[2]
+            image[addrs.dpi_checksum] = checksum(*raw)
+        return image
+
+
+def parse_rules(data: dict) -> List[Rule]:
+    """Validate the [[rule]] tables of a rules file"""
+    rules = []
+    for entry in data.get('rule', []):
+        unknown = set(entry) - set(Rule._fields)
+        if unknown:
+            raise ValueError(f'unknown rule keys: {", ".join(sorted(unknown))}')
+        rule = Rule(**entry)
+        if rule.polling_rate is not None and rule.polling_rate not in PollingRateHz:
+            raise ValueError(f'polling_rate must be one of {sorted(PollingRateHz)}')
+        if rule.dpi_mode is not None and not (DPI_MODE_MIN <= rule.dpi_mode <= DPI_MODE_MAX):
+            raise ValueError(f'dpi_mode must be between {DPI_MODE_MIN} and {DPI_MODE_MAX}')
+        if rule.dpi is not None:
+            dpi_int_to_raw(rule.dpi)
+        rules.append(rule)
+    return rules
+
+
+def load_config(path: str) -> dict:
+    with open(path, 'rb') as f:
+        if path.endswith('.toml'):
+            if tomllib is None:
+                raise ValueError('TOML files need Python 3.11+ or the tomli package')
+            return tomllib.load(f)
+        return json.load(f)
+
+
+def load_rules(path: str) -> List[Rule]:
+    return parse_rules(load_config(path))
+
+
+class RuleEngine:
+    """Precomputes each rule's frames so a focus change only has to send them"""
+
+    def __init__(self, mouse, rules: List[Rule]):
+        self.mouse = mouse
+        # a rate the connected model cannot do is left alone rather than written
+        self.rules = [
+            rule._replace(polling_rate=None)
+            if rule.polling_rate is not None and rule.polling_rate not in mouse.polling_rates
+            else rule
+            for rule in rules
+        ]
+        self.active: Optional[Rule] = None
+        self.last_latency: Optional[float] = None
+        # rule -> MEM_SET frames against the cached image of one generation
+        self._plans: Dict[Rule, List[Dict[int, int]]] = {}
+        self._planned_generation = None
+        # what the rules overwrote, by profile, for apps that have no rule
+        self._saved: Dict[int, Dict[int, int]] = {}
+        self._home_profile: Optional[int] = None
+
+    def rule_for(self, app: str) -> Optional[Rule]:
+        for rule in self.rules:
+            if fnmatch.fnmatchcase(app, rule.match):
+                return rule
+        return None
+
+    def replan(self):
+        """Plan every rule that stays on the current profile against the cache"""
+        mouse = self.mouse
+        if self._planned_generation == mouse.generation:
+            return
+        self._plans = {}
+        for rule in self.rules:
+            if rule.profile is None or rule.profile == mouse.profile:
+                self._plans[rule] = mouse.plan(rule.target(mouse.dpi_mode))
+        # planning may have read missing registers into the cache
+        self._planned_generation = mouse.generation
+
+    def focus(self, app: str) -> bool:
+        """Apply the rule for app, True if the mouse changed"""
+        rule = self.rule_for(app)
+        if rule is None:
+            return self.restore()
+        if rule == self.active:
+            return False
+        started = time.perf_counter()
+        mouse = self.mouse
+        if self.active is None:
+            self._home_profile = mouse.profile
+        if self._planned_generation != mouse.generation:
+            self.replan()
+        frames = self._plans.get(rule)
+        if frames is None:
+            # other profile: switch first, its image decides what is left
+            mouse.profile = rule.profile
+            if not mouse.settings:
+                mouse.read_settings()
+            frames = mouse.plan(rule.target(mouse.dpi_mode))
+        saved = self._saved.setdefault(mouse.profile, {})
+        for addresses in frames:
+            for address in addresses:
+                saved.setdefault(address, mouse.settings[address])
+        mouse.write_frames(frames)
+        self.last_latency = time.perf_counter() - started
+        self.active = rule
+        # get the next switch ready while nothing is waiting on us
+        self.replan()
+        return True
+
+    def restore(self) -> bool:
+        """Write back what the rules changed, True if the mouse changed"""
+        if self.active is None:
+            return False
+        started = time.perf_counter()
+        mouse = self.mouse
+        home = self._home_profile
+        # the profile that was active before the first rule goes last
+        for profile in sorted(self._saved, key=lambda profile: profile == home):
+            if profile != mouse.profile:
+                mouse.profile = profile
+                if not mouse.settings:
+                    mouse.read_settings()
+            mouse.write_frames(mouse.plan(self._saved[profile]))
+        if mouse.profile != home:
+            mouse.profile = home
+        self.last_latency = time.perf_counter() - started
+        self.active = None
+        self._saved = {}
+        self._home_profile = None
+        self.replan()
+        return True
+
+
+class ManualFocusSource:
+    """Focus source driven by calls to focus(), for the KWin script and tests"""
+
+    def __init__(self):
+        self._callback: Optional[Callable[[str], None]] = None
+
+    def start(self, callback: Callable[[str], None]):
+        self._callback = callback
+
+    def stop(self):
+        self._callback = None
+
+    def focus(self, app: str):
+        if self._callback is not None:
+            self._callback(app)
+
+
+class X11FocusSource:
+    """Follows _NET_ACTIVE_WINDOW on the root window, needs python-xlib"""
+
+    def __init__(self):
+        try:
+            from Xlib import X, display
+        except ImportError:
+            raise RuntimeError('X11 focus tracking needs the python-xlib package')
+        self._X = X
+        self.display = display.Display()
+        self.root = self.display.screen().root
+        self._active = self.display.intern_atom('_NET_ACTIVE_WINDOW')
+        self._callback = None
+        self._watch = None
+
+    def start(self, callback: Callable[[str], None]):
+        from gi.repository import GLib
+        self._callback = callback
+        self.root.change_attributes(event_mask=self._X.PropertyChangeMask)
+        self._watch = GLib.io_add_watch(self.display.fileno(), GLib.IO_IN, self._on_readable)
+        self._report()
+
+    def stop(self):
+        from gi.repository import GLib
+        if self._watch is not None:
+            GLib.source_remove(self._watch)
+            self._watch = None
+        self._callback = None
+
+    def _report(self):
+        prop = self.root.get_full_property(self._active, self._X.AnyPropertyType)
+        if not prop or not prop.value or not prop.value[0]:
+            return
+        window = self.display.create_resource_object('window', prop.value[0])
+        try:
+            wm_class = window.get_wm_class()
+        except Exception:
+            return
+        if wm_class and self._callback is not None:
+            self._callback(wm_class[1])
+
+    def _on_readable(self, source, condition):
+        changed = False
+        while self.display.pending_events():
+            event = self.display.next_event()
+            if event.type == self._X.PropertyNotify and event.atom == self._active:
+                changed = True
+        if changed:
+            self._report()
+        return True
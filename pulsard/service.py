@@ -0,0 +1,608 @@
+#!/usr/bin/env python3
+"""
+Pulsar Mouse Tool - D-Bus Service
+Owns the USB handle and serves cached settings as org.pulsar.Pulsar
+"""
+
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+# Allow running straight from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dbus
+import dbus.service
+from dbus.mainloop.glib import DBusGMainLoop
+from gi.repository import GLib
+
+from pulsar_lib import Device, HidrawDevice, PulsarX2V2Mini, LEDEffect
+from pulsar_lib.constants import (
+    DPI_MODE_CT_MAX,
+    DPI_MODE_CT_MIN,
+    DPI_MODE_MAX,
+    DPI_MODE_MIN,
+    LED_BRIGHTNESS_MAX,
+    LED_BRIGHTNESS_MIN,
+)
+from pulsar_lib.mouse import color_to_int, dpi_int_to_raw
+from pulsar_lib.payloads import DPIModeDeviceEventPayload, PowerDeviceEventPayload
+from pulsar_lib.scheduler import Priority, ScheduledDevice
+from pulsar_lib.stats import TransportStats
+from pulsard import metrics
+from pulsard.cache import default_cache_path, load_cache, save_cache
+from pulsard.coalesce import Coalescer
+from pulsard.policy import PowerPolicy, load_policy
+from pulsard.rules import ManualFocusSource, RuleEngine, X11FocusSource, load_rules
+from pulsard.statusboard import StatusBoard
+
+
+BUS_NAME = 'org.pulsar.Pulsar'
+OBJECT_PATH = '/org/pulsar/Pulsar'
+INTERFACE = 'org.pulsar.Pulsar'
+
+POWER_POLL_SECONDS = 30
+EVENT_POLL_MS = 500
+RECONNECT_SECONDS = 5
+TEXTFILE_SECONDS = 15
+IDLE_CHECK_SECONDS = 10
+
+# saved with the cache, never published
+POLICY_CACHE_KEY = 'power_policy'
+
+# first descriptor systemd passes to a socket-activated service
+SD_LISTEN_FDS_START = 3
+
+# slider-style settings are written at most once per interval per field,
+# always ending with the latest value
+COALESCE_SECONDS = 0.05
+
+
+def to_dbus(value):
+    """Wrap nested settings so every level marshals as a variant"""
+    if isinstance(value, dict):
+        return dbus.Dictionary(
+            {k: to_dbus(v) for k, v in value.items() if v is not None},
+            signature='sv')
+    if isinstance(value, (list, tuple)):
+        return dbus.Array([to_dbus(v) for v in value], signature='v')
+    if isinstance(value, bool):
+        return dbus.Boolean(value)
+    if isinstance(value, int):
+        return dbus.Int32(value)
+    return dbus.String(value)
+
+
+def glib_schedule(delay, callback):
+    def fire():
+        callback()
+        return False
+    GLib.timeout_add(max(1, round(delay * 1000)), fire)
+
+
+def systemd_listen_fds():
+    """Descriptors of the sockets systemd activated us for, if any"""
+    if os.environ.get('LISTEN_PID') != str(os.getpid()):
+        return []
+    count = int(os.environ.get('LISTEN_FDS', '0'))
+    for name in ('LISTEN_PID', 'LISTEN_FDS', 'LISTEN_FDNAMES'):
+        os.environ.pop(name, None)
+    return list(range(SD_LISTEN_FDS_START, SD_LISTEN_FDS_START + count))
+
+
+def invalid_args(message):
+    return dbus.exceptions.DBusException(
+        message, name=f'{INTERFACE}.Error.InvalidArgs')
+
+
+class PulsarService(dbus.service.Object):
+    def __init__(self, bus, rules=None, transport=Device, power_levels=None,
+                 cache_path=None, status_board=None):
+        super().__init__(bus, OBJECT_PATH)
+        self.bus = bus
+        self.transport = transport
+        self.dev = None
+        self.mouse = None
+        self.rules = rules or []
+        self.rule_engine = None
+        # fed by ActiveWindowChanged, e.g. from a KWin script
+        self.window_focus = ManualFocusSource()
+        # outlives the connection so the user's settings survive a replug
+        self.power_policy = PowerPolicy(power_levels) if power_levels else None
+        # last values published to clients, keyed like get_all_settings()
+        self.cache_path = cache_path
+        restored = load_cache(cache_path) if cache_path else None
+        policy_state = restored.pop(POLICY_CACHE_KEY, None) if restored else None
+        if self.power_policy is not None and policy_state:
+            self.power_policy.restore(policy_state)
+        self.cache = restored or {'connected': False}
+        # reads are answered from the saved cache until the first connect
+        self._restored = restored is not None
+        # mirrors the cache for readers that use neither D-Bus nor USB
+        self.status_board = status_board
+        if status_board is not None:
+            status_board.write(self.cache)
+        self._reconnect_pending = False
+        self._coalescers = {}
+        # D-Bus replies of coalesced calls, sent once their value is written
+        self._waiters = {}
+        # clients that asked to keep the service running, by unique bus name
+        self._subscribers = {}
+        self.last_activity = time.monotonic()
+        # survives reconnects so exported counters never go backwards
+        self.stats = TransportStats()
+        if self._restored:
+            # let the bus deliver the activating call before the USB reads
+            GLib.idle_add(self._on_activated)
+        else:
+            self.connect()
+        GLib.timeout_add_seconds(POWER_POLL_SECONDS, self._on_power_timer)
+        GLib.timeout_add(EVENT_POLL_MS, self._on_event_timer)
+
+    def connect(self):
+        """Open the mouse and load its memory image"""
+        if not self._open():
+            self.disconnect()
+        return self.mouse is not None
+
+    def _open(self) -> bool:
+        self._restored = False
+        try:
+            transport = self.transport()
+            transport.stats = self.stats
+            # D-Bus calls run on the main loop, battery polls on a worker thread
+            self.dev = ScheduledDevice(transport)
+            self.mouse = PulsarX2V2Mini(self.dev)
+            self.mouse.read_settings()
+            if self.rules:
+                self.rule_engine = RuleEngine(self.mouse, self.rules)
+                self.rule_engine.replan()
+            power = self.mouse.get_power()
+            leveled = self.power_policy is not None and self.power_policy.update(self.mouse, power)
+            self.publish(connected=True, power=power.to_dict(),
+                         polling_rates=self.mouse.polling_rates,
+                         **self.mouse.get_settings())
+            if leveled:
+                self.save()
+        except Exception as e:
+            print(f"Mouse not available: {e}")
+            self._close()
+            return False
+        return True
+
+    def _close(self):
+        if self.dev is not None:
+            self.dev.close()
+        self.dev = None
+        self.mouse = None
+        self.rule_engine = None
+
+    def disconnect(self):
+        self._close()
+        if self.cache.get('connected'):
+            # once per lost connection, failed retries leave the cache alone
+            self.publish(connected=False)
+            self.save()
+        if not self._reconnect_pending:
+            self._reconnect_pending = True
+            GLib.timeout_add_seconds(RECONNECT_SECONDS, self._on_reconnect_timer)
+
+    def publish(self, **values):
+        """Update the cache and signal only the keys whose value changed"""
+        changed = {k: v for k, v in values.items() if self.cache.get(k) != v}
+        if changed:
+            self.cache.update(changed)
+            if self.status_board is not None:
+                self.status_board.write(self.cache)
+            self.PropertiesChanged(to_dbus(changed))
+
+    def save(self):
+        """Persist the cache for the next activation"""
+        if self.cache_path is None or 'power' not in self.cache:
+            return
+        cache = self.cache
+        if self.power_policy is not None:
+            cache = {**cache, POLICY_CACHE_KEY: self.power_policy.state()}
+        try:
+            save_cache(self.cache_path, cache)
+        except OSError as e:
+            print(f"Error saving {self.cache_path}: {e}")
+
+    def _touch(self):
+        self.last_activity = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        """How long nobody has needed the service, 0 while a client is subscribed"""
+        if self._subscribers:
+            return 0.0
+        return time.monotonic() - self.last_activity
+
+    def _require_cache(self):
+        """Make sure reads have something to answer from"""
+        self._touch()
+        if not self._restored:
+            self._require_mouse()
+
+    def _require_mouse(self):
+        self._touch()
+        if self.mouse is None and not self.connect():
+            raise dbus.exceptions.DBusException(
+                'No Pulsar mouse found', name=f'{INTERFACE}.Error.NotConnected')
+        return self.mouse
+
+    def _write(self, apply):
+        """Run a setter against the mouse and publish what it changed"""
+        mouse = self._require_mouse()
+        try:
+            apply(mouse)
+        except (TypeError, ValueError, KeyError) as e:
+            raise invalid_args(str(e))
+        except Exception:
+            self.disconnect()
+            raise
+        if self.power_policy is not None and self.power_policy.remember(mouse):
+            self.save()
+        self.publish(**mouse.get_settings())
+
+    def _write_coalesced(self, key, value, apply, reply, error):
+        """Rate-limit writes to one field, keeping only the latest value"""
+        coalescer = self._coalescers.get(key)
+        if coalescer is None:
+            def write(value):
+                # callers whose value was replaced get the outcome of the
+                # write that replaced it, so a client never keeps a value
+                # the mouse did not take
+                waiters = self._waiters.pop(key, [])
+                try:
+                    self._write(lambda mouse: apply(mouse, value))
+                except Exception as e:
+                    print(f"Error writing {key}: {e}")
+                    for _, fail in waiters:
+                        fail(e)
+                else:
+                    for done, _ in waiters:
+                        done()
+            coalescer = Coalescer(write, COALESCE_SECONDS, glib_schedule)
+            self._coalescers[key] = coalescer
+        self._require_mouse()
+        self._waiters.setdefault(key, []).append((reply, error))
+        coalescer.submit(value)
+
+    def flush(self):
+        """Write every value still waiting in a coalescer"""
+        for coalescer in self._coalescers.values():
+            coalescer.flush()
+
+    def _on_event_timer(self):
+        if self.mouse is not None:
+            try:
+                # drains what is waiting, including events that arrived
+                # while the battery poll waited for its reply
+                for event in self.mouse.events(timeout=0.001):
+                    # payload is None for a write made by another program
+                    if event.payload is None or isinstance(event.payload, DPIModeDeviceEventPayload):
+                        self.publish(**self.mouse.get_settings())
+                    elif isinstance(event.payload, PowerDeviceEventPayload):
+                        self.on_power(event.changes['power'])
+            except Exception as e:
+                print(f"Error reading device events: {e}")
+                self.disconnect()
+        return True
+
+    def _poll_power(self, mouse):
+        try:
+            with ScheduledDevice.priority(Priority.BACKGROUND):
+                power = mouse.get_power()
+        except Exception as e:
+            print(f"Error polling power: {e}")
+            GLib.idle_add(self._on_poll_failed, mouse)
+            return
+        GLib.idle_add(self._on_power_polled, mouse, power)
+
+    def _on_power_polled(self, mouse, power):
+        if mouse is self.mouse:
+            try:
+                self.on_power(power)
+            except Exception as e:
+                print(f"Error applying power policy: {e}")
+                self.disconnect()
+        return False
+
+    def on_power(self, power):
+        """Publish a battery reading and move to the power level it calls for"""
+        self.publish(power=power.to_dict())
+        if self.power_policy is not None and self.power_policy.update(self.mouse, power):
+            self.publish(**self.mouse.get_settings())
+            # a restart must still know the user's settings to go back to
+            self.save()
+
+    def _on_poll_failed(self, mouse):
+        if mouse is self.mouse:
+            self.disconnect()
+        return False
+
+    def _on_power_timer(self):
+        if self.mouse is not None:
+            # a D-Bus write issued meanwhile goes ahead of the poll's frames
+            threading.Thread(target=self._poll_power, args=(self.mouse,),
+                             daemon=True).start()
+        return True
+
+    def on_focus(self, app):
+        """Apply the rule for the newly focused application, if any"""
+        if self.rule_engine is None:
+            return
+        try:
+            changed = self.rule_engine.focus(app)
+        except Exception as e:
+            print(f"Error applying rule for {app}: {e}")
+            self.disconnect()
+            return
+        if changed:
+            self.publish(**self.mouse.get_settings())
+
+    def render_metrics(self):
+        """OpenMetrics text from the cache only, callable from any thread"""
+        # a scrape is not a client, a scraped service still idles out and
+        # the metrics socket starts it again for the next scrape
+        return metrics.render(dict(self.cache), self.stats.snapshot())
+
+    def _on_activated(self):
+        self.connect()
+        return False
+
+    def _on_reconnect_timer(self):
+        if self.mouse is None and not self._open():
+            return True
+        self._reconnect_pending = False
+        return False
+
+    @dbus.service.signal(INTERFACE, signature='a{sv}')
+    def PropertiesChanged(self, changed):
+        """Emitted with only the keys whose cached value changed"""
+
+    @dbus.service.method(INTERFACE, out_signature='b')
+    def IsConnected(self):
+        self._touch()
+        return self.mouse is not None
+
+    @dbus.service.method(INTERFACE, sender_keyword='sender')
+    def Subscribe(self, sender=None):
+        """Keep the service running until the caller leaves the bus"""
+        self._touch()
+        if sender is None or sender in self._subscribers:
+            return
+
+        def on_owner_changed(owner):
+            if not owner:
+                watch = self._subscribers.pop(sender, None)
+                if watch is not None:
+                    watch.cancel()
+                self._touch()
+        self._subscribers[sender] = self.bus.watch_name_owner(sender, on_owner_changed)
+
+    @dbus.service.method(INTERFACE, out_signature='a{sv}')
+    def GetPower(self):
+        self._require_cache()
+        return to_dbus(self.cache['power'])
+
+    @dbus.service.method(INTERFACE, out_signature='a{sv}')
+    def GetAllSettings(self):
+        self._require_cache()
+        return to_dbus({k: v for k, v in self.cache.items() if k != 'connected'})
+
+    @dbus.service.method(INTERFACE, in_signature='i')
+    def SetProfile(self, profile):
+        def apply(mouse):
+            mouse.profile = int(profile)
+            if not mouse.settings:
+                # first visit to this profile, later switches use the cache
+                mouse.read_settings()
+        self._write(apply)
+
+    @dbus.service.method(INTERFACE, in_signature='ii', async_callbacks=('reply', 'error'))
+    def SetDPI(self, mode, dpi, reply, error):
+        mode, dpi = int(mode), int(dpi)
+        if not (DPI_MODE_MIN <= mode <= DPI_MODE_MAX):
+            raise invalid_args(f'no DPI mode {mode}')
+        try:
+            dpi_int_to_raw(dpi)
+        except ValueError as e:
+            raise invalid_args(str(e) or f'invalid DPI {dpi}')
+        self._write_coalesced(('dpi', mode), dpi,
+                              lambda mouse, value: mouse.set_dpi(mode, value), reply, error)
+
+    @dbus.service.method(INTERFACE, in_signature='ai', async_callbacks=('reply', 'error'))
+    def SetDPITable(self, dpis, reply, error):
+        dpis = [int(dpi) for dpi in dpis]
+        if not (DPI_MODE_CT_MIN <= len(dpis) <= DPI_MODE_CT_MAX):
+            raise invalid_args(f'between {DPI_MODE_CT_MIN} and {DPI_MODE_CT_MAX} DPI stages')
+        for dpi in dpis:
+            try:
+                dpi_int_to_raw(dpi)
+            except ValueError as e:
+                raise invalid_args(str(e) or f'invalid DPI {dpi}')
+        self._write_coalesced('dpi_table', dpis,
+                              lambda mouse, value: mouse.set_dpi_table(value), reply, error)
+
+    @dbus.service.method(INTERFACE, in_signature='i')
+    def SetDPIMode(self, mode):
+        def apply(mouse):
+            mouse.dpi_mode = int(mode)
+        self._write(apply)
+
+    @dbus.service.method(INTERFACE, in_signature='i')
+    def SetPollingRate(self, rate):
+        def apply(mouse):
+            mouse.polling_rate = int(rate)
+        self._write(apply)
+
+    @dbus.service.method(INTERFACE, in_signature='s')
+    def SetLEDEffect(self, effect):
+        def apply(mouse):
+            if effect == 'off':
+                mouse.led_enabled = False
+            else:
+                mouse.led_effect = LEDEffect[str(effect).upper()]
+                mouse.led_enabled = True
+        self._write(apply)
+
+    @dbus.service.method(INTERFACE, in_signature='i', async_callbacks=('reply', 'error'))
+    def SetLEDBrightness(self, brightness, reply, error):
+        brightness = int(brightness)
+        if not (LED_BRIGHTNESS_MIN <= brightness <= LED_BRIGHTNESS_MAX):
+            raise invalid_args(f'brightness must be {LED_BRIGHTNESS_MIN}-{LED_BRIGHTNESS_MAX}')
+        def apply(mouse, value):
+            mouse.led_brightness = value
+        self._write_coalesced('led_brightness', brightness, apply, reply, error)
+
+    @dbus.service.method(INTERFACE, in_signature='is', async_callbacks=('reply', 'error'))
+    def SetLEDColor(self, mode, color, reply, error):
+        mode, color = int(mode), str(color)
+        if not (DPI_MODE_MIN <= mode <= DPI_MODE_MAX):
+            raise invalid_args(f'no DPI mode {mode}')
+        try:
+            color_to_int(color)
+        except ValueError:
+            raise invalid_args(f'invalid color {color!r}')
+        self._write_coalesced(('led_color', mode), color,
+                              lambda mouse, value: mouse.set_led_color(mode, value), reply, error)
+
+    @dbus.service.method(INTERFACE, in_signature='s')
+    def ActiveWindowChanged(self, app):
+        self.window_focus.focus(str(app))
+
+    @dbus.service.method(INTERFACE, in_signature='as', async_callbacks=('reply', 'error'))
+    def SetLEDColors(self, colors, reply, error):
+        colors = [str(color) for color in colors]
+        if len(colors) > DPI_MODE_CT_MAX:
+            raise invalid_args(f'at most {DPI_MODE_CT_MAX} colors')
+        for color in colors:
+            try:
+                color_to_int(color)
+            except ValueError:
+                raise invalid_args(f'invalid color {color!r}')
+        self._write_coalesced('led_colors', colors,
+                              lambda mouse, value: mouse.set_led_colors(value), reply, error)
+
+    @dbus.service.method(INTERFACE)
+    def RestoreDefaults(self):
+        def apply(mouse):
+            mouse.restore()
+            mouse.read_settings()
+        self._write(apply)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pulsar mouse D-Bus service')
+    parser.add_argument('--metrics-port', type=int,
+                        help='serve OpenMetrics on 127.0.0.1:PORT')
+    parser.add_argument('--metrics-socket',
+                        help='serve OpenMetrics over HTTP on a Unix socket')
+    parser.add_argument('--metrics-textfile',
+                        help='rewrite this file for the node_exporter textfile collector')
+    parser.add_argument('--hidraw', action='store_true',
+                        help='use /dev/hidrawN instead of detaching the kernel driver')
+    parser.add_argument('--rules',
+                        help='TOML or JSON file of per-application rules')
+    parser.add_argument('--power-policy',
+                        help='TOML or JSON file of battery levels and the settings for each')
+    parser.add_argument('--idle-exit', type=int, metavar='SECONDS',
+                        help='exit after SECONDS without clients, for D-Bus or socket activation')
+    parser.add_argument('--cache-file', default=default_cache_path(),
+                        help='where the settings are kept between runs')
+    parser.add_argument('--status-board', metavar='PATH',
+                        help='memory-mapped status record (default: $XDG_RUNTIME_DIR/pulsar-status)')
+    parser.add_argument('--no-status-board', action='store_true',
+                        help='do not publish the status record')
+    parser.add_argument('--focus', choices=['kwin', 'x11'], default='kwin',
+                        help='where the focused application comes from')
+    args = parser.parse_args()
+
+    rules = []
+    if args.rules:
+        try:
+            rules = load_rules(args.rules)
+        except (OSError, TypeError, ValueError) as e:
+            raise SystemExit(f'{args.rules}: {e}')
+
+    power_levels = []
+    if args.power_policy:
+        try:
+            power_levels = load_policy(args.power_policy)
+        except (OSError, TypeError, ValueError) as e:
+            raise SystemExit(f'{args.power_policy}: {e}')
+
+    DBusGMainLoop(set_as_default=True)
+    bus = dbus.SessionBus()
+    name = dbus.service.BusName(BUS_NAME, bus)
+    status_board = None if args.no_status_board else StatusBoard(args.status_board)
+    service = PulsarService(bus, rules, HidrawDevice if args.hidraw else Device, power_levels,
+                            args.cache_file, status_board)
+    if rules:
+        focus = service.window_focus if args.focus == 'kwin' else X11FocusSource()
+        focus.start(service.on_focus)
+
+    listen_fds = systemd_listen_fds()
+    if listen_fds:
+        metrics.serve(service.render_metrics, listen_fd=listen_fds[0])
+    if args.metrics_port is not None or args.metrics_socket is not None:
+        metrics.serve(service.render_metrics, port=args.metrics_port,
+                      socket_path=args.metrics_socket)
+    if args.metrics_textfile:
+        def write_textfile():
+            try:
+                metrics.write_textfile(args.metrics_textfile, service.render_metrics())
+            except OSError as e:
+                print(f"Error writing {args.metrics_textfile}: {e}")
+            return True
+        write_textfile()
+        GLib.timeout_add_seconds(TEXTFILE_SECONDS, write_textfile)
+
+    loop = GLib.MainLoop()
+
+    def stop():
+        # coalesced calls are answered while the loop can still send replies
+        service.flush()
+        bus.flush()
+        loop.quit()
+        return False
+
+    # systemd stops the service with SIGTERM, which must still save the cache
+    GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM, stop)
+    if args.idle_exit:
+        resident = [option for option, used in (
+            ('--rules', rules),
+            ('--power-policy', power_levels),
+            ('--metrics-port', args.metrics_port is not None),
+            ('--metrics-socket', args.metrics_socket is not None),
+            ('--metrics-textfile', args.metrics_textfile),
+        ) if used]
+        if resident:
+            print(f"Not exiting when idle: {', '.join(resident)} need the service running")
+        else:
+            def check_idle():
+                if service.idle_seconds() >= args.idle_exit:
+                    return stop()
+                return True
+            GLib.timeout_add_seconds(IDLE_CHECK_SECONDS, check_idle)
+
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # after Ctrl-C the values are still written, without replies
+        service.flush()
+        if service.dev is not None:
+            service.dev.close()
+        service.save()
+        if status_board is not None:
+            status_board.close(service.cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Pulsar Mouse Tool - shared-memory status board
+A fixed record pulsard rewrites on every change, read without USB or D-Bus
+
+Only the standard library modules below are imported, so status bars and
+shell prompts can poll it: `python3 -m pulsard.statusboard --format '{battery_percent}%'`.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+
+MAGIC = b'PLSB'
+# bump whenever RECORD changes; readers refuse other versions
+VERSION = 1
+
+# magic, version, size, seq; seq is odd while the writer is mid-update
+HEADER = struct.Struct('<4sHHI4x')
+# generation, updated (time.time_ns()), flags, battery %, DPI mode,
+# DPI mode count, polling rate, battery mV, DPI of each of the 4 modes
+RECORD = struct.Struct('<QqBBBBHH4H')
+SIZE = HEADER.size + RECORD.size
+SEQ_OFFSET = 8
+
+FLAG_CONNECTED = 0x01
+FLAG_CHARGING = 0x02
+# cleared when pulsard exits, the values are then the last ones it saw
+FLAG_SERVICE = 0x04
+
+# seqlock retries before a reader gives up on a busy writer
+READ_ATTEMPTS = 100
+
+
+def default_path():
+    runtime = os.environ.get('XDG_RUNTIME_DIR') or f'/tmp/pulsar-{os.getuid()}'
+    return os.path.join(runtime, 'pulsar-status')
+
+
+class StatusBoard:
+    """Single writer of the status record, owned by pulsard"""
+
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # a fresh file is swapped in so a reader never maps a short one
+        tmp = f'{self.path}.{os.getpid()}'
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, SIZE, 0) + bytes(RECORD.size))
+        os.replace(tmp, self.path)
+        self._fd = os.open(self.path, os.O_RDWR)
+        self._map = mmap.mmap(self._fd, SIZE)
+        self.seq = 0
+        self.generation = 0
+
+    def write(self, cache, running=True):
+        """Publish a get_all_settings()-shaped cache under the seqlock"""
+        power = cache.get('power') or {}
+        flags = 0
+        if cache.get('connected'):
+            flags |= FLAG_CONNECTED
+        if power.get('connected'):
+            flags |= FLAG_CHARGING
+        if running:
+            flags |= FLAG_SERVICE
+        modes = cache.get('dpi_modes') or []
+        dpis = [mode.get('dpi', 0) for mode in modes[:4]]
+        dpis += [0] * (4 - len(dpis))
+        self.generation += 1
+        record = RECORD.pack(
+            self.generation,
+            time.time_ns(),
+            flags,
+            power.get('battery_percent', 0),
+            cache.get('active_dpi_mode', 0),
+            len(modes),
+            cache.get('polling_rate_hz', 0),
+            power.get('battery_millivolts', 0),
+            *dpis,
+        )
+        self.seq += 1
+        struct.pack_into('<I', self._map, SEQ_OFFSET, self.seq)
+        self._map[HEADER.size:SIZE] = record
+        self.seq += 1
+        struct.pack_into('<I', self._map, SEQ_OFFSET, self.seq)
+
+    def close(self, cache=None):
+        if self._map is None:
+            return
+        if cache is not None:
+            self.write(cache, running=False)
+        self._map.close()
+        os.close(self._fd)
+        self._map = None
+
+
+def read_status(path=None):
+    """The current record as a dict, None if pulsard never wrote one"""
+    try:
+        fd = os.open(path or default_path(), os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        if os.fstat(fd).st_size < SIZE:
+            return None
+        board = mmap.mmap(fd, SIZE, prot=mmap.PROT_READ)
+    finally:
+        os.close(fd)
+    try:
+        for _ in range(READ_ATTEMPTS):
+            data = board[:SIZE]
+            magic, version, size, seq = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION or size != SIZE:
+                raise ValueError(f'unsupported status board version {version}')
+            if seq & 1 or struct.unpack_from('<I', board, SEQ_OFFSET)[0] != seq:
+                # let the writer finish instead of spinning against it
+                os.sched_yield()
+                continue
+            break
+        else:
+            raise RuntimeError('status board is being rewritten continuously')
+    finally:
+        board.close()
+    (generation, updated, flags, battery, dpi_mode, dpi_mode_count,
+     polling_rate, millivolts, *dpis) = RECORD.unpack_from(data, HEADER.size)
+    if generation == 0:
+        # created, the first record is not written yet
+        return None
+    return {
+        'generation': generation,
+        'updated': updated / 1e9,
+        'service_running': bool(flags & FLAG_SERVICE),
+        'connected': bool(flags & FLAG_CONNECTED),
+        'charging': bool(flags & FLAG_CHARGING),
+        'battery_percent': battery,
+        'battery_millivolts': millivolts,
+        'active_dpi_mode': dpi_mode,
+        'dpi': dpis[dpi_mode] if dpi_mode < 4 else 0,
+        'dpis': dpis[:dpi_mode_count],
+        'polling_rate_hz': polling_rate,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the status pulsard last published')
+    parser.add_argument('--path', help='status record (default: $XDG_RUNTIME_DIR/pulsar-status)')
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--json', action='store_true', help='print every field as JSON')
+    output.add_argument('--format', metavar='TEMPLATE',
+                        help="str.format() template over the JSON fields, e.g. '{battery_percent}%%'")
+    args = parser.parse_args()
+
+    status = read_status(args.path)
+    if status is None:
+        print('pulsard has not published a status yet', file=sys.stderr)
+        sys.exit(1)
+    if args.json:
+        import json
+        print(json.dumps(status, sort_keys=True))
+    elif args.format is not None:
+        try:
+            print(args.format.format(**status))
+        except (KeyError, IndexError, ValueError) as e:
+            raise SystemExit(f'invalid --format: {e}')
+    elif not status['connected']:
+        print('disconnected')
+    else:
+        print(f"{status['battery_percent']}%{' charging' if status['charging'] else ''} "
+              f"{status['dpi']} DPI {status['polling_rate_hz']} Hz")
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,7 @@ setup(
     entry_points={
         "console_scripts": [
             "pulsard=pulsard.service:main",
+            "pulsar-status=pulsard.statusboard:main",
         ],
     },
 )